@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# Changelog report latency over 1M file_activity rows
+# Compares the old layout (TEXT timestamps, no indexes, GROUP BY over
+# raw rows) with the current one (reports read the per-project daily
+# rollup, plus a few recent file names per project).
+# Runs against a throwaway HOME, so your real ~/myclaw/changelog.db
+# is never touched.
+#
+# Run: python benchmarks/changelog_report.py [rows]
+
+import os
+import sys
+import time
+import random
+import sqlite3
+import tempfile
+from datetime import datetime
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+DAYS = 90
+PROJECTS = 20
+FILES_PER_PROJECT = 100
+
+home = tempfile.mkdtemp(prefix="kvclaw_bench_")
+os.makedirs(os.path.join(home, "myclaw"))
+os.environ["HOME"] = home
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from plugins import changelog
+from plugins import storage
+
+def fake_rows():
+    now = int(time.time())
+    random.seed(7)
+    for _ in range(ROWS):
+        project = "project" + str(random.randrange(PROJECTS))
+        filename = "file" + str(random.randrange(FILES_PER_PROJECT)) + ".py"
+        yield (
+            now - random.randrange(DAYS * 86400),
+            "/code/" + project + "/" + filename,
+            filename,
+            project,
+            random.choice(["modified", "modified", "modified", "created"]),
+            random.randrange(50000)
+        )
+
+def timed(fn, runs=5):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    changelog.init_db()
+
+    print("Inserting " + str(ROWS) + " rows...")
+    with storage.transaction(changelog.DB_PATH) as conn:
+        conn.executemany("""
+            INSERT INTO file_activity (ts, filepath, filename, project, action, size_bytes)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, fake_rows())
+        # save_changes keeps the rollups current; bulk loading has to build
+        # them (the project rollup follows the file rollup's triggers)
+        changelog.rebuild_daily_rollup(conn.cursor())
+
+    # Same data in the old layout
+    legacy = sqlite3.connect(os.path.join(home, "legacy.db"))
+    legacy.execute("""
+        CREATE TABLE file_activity (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT, filepath TEXT, filename TEXT,
+            project TEXT, action TEXT, size_bytes INTEGER
+        )
+    """)
+    legacy.executemany(
+        "INSERT INTO file_activity (timestamp, filepath, filename, project, action, size_bytes) VALUES (?, ?, ?, ?, ?, ?)",
+        (
+            (datetime.fromtimestamp(r[0]).strftime("%Y-%m-%d %H:%M:%S"),) + r[1:]
+            for r in conn.execute("SELECT ts, filepath, filename, project, action, size_bytes FROM file_activity")
+        )
+    )
+    legacy.commit()
+
+    def legacy_report(days):
+        since = datetime.fromtimestamp(time.time() - days * 86400).strftime("%Y-%m-%d %H:%M:%S")
+        legacy.execute("""
+            SELECT project, filename, action, COUNT(*) as edits
+            FROM file_activity
+            WHERE timestamp > ?
+            GROUP BY project, filename, action
+            ORDER BY project, edits DESC
+        """, (since,)).fetchall()
+
+    print("")
+    print("report        legacy ms   current ms")
+    for days in [1, 7, 30]:
+        old = timed(lambda: legacy_report(days))
+        new = timed(lambda: changelog.generate_report(days=days))
+        print(("days=" + str(days)).ljust(14) + str(round(old, 1)).rjust(9) + str(round(new, 1)).rjust(13))
+
+    legacy.close()
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,6 @@
 import os
 import subprocess
 import psutil
-import chromadb
 import asyncio
 import threading
 import time
@@ -17,6 +16,10 @@ import whisper
 from google import genai as google_genai
 from mistralai import Mistral
 from plugins.loader import load_plugins, get_plugin_prompts, find_plugin
+from memory_store import (
+    save_conversation, save_fact, recall_memory, compact_facts, compact_conversations,
+    should_recall, recall_was_useful, log_recall, recall_gate_report
+)
 
 load_dotenv()
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
@@ -88,43 +91,6 @@ def get_history():
 def clear_history():
     conversation_history.clear()
 
-memory_client = chromadb.PersistentClient(path="./memory")
-conversation_memory = memory_client.get_or_create_collection("conversations")
-facts_memory = memory_client.get_or_create_collection("facts")
-
-def save_conversation(user_msg, bot_reply):
-    timestamp = str(datetime.now().timestamp())
-    conversation_memory.add(
-        documents=["User: " + user_msg + "\nkvchClaw: " + bot_reply],
-        ids=[timestamp],
-        metadatas={"time": str(datetime.now()), "date": datetime.now().strftime("%Y-%m-%d")}
-    )
-
-def save_fact(text):
-    facts_memory.add(
-        documents=[text],
-        ids=[str(datetime.now().timestamp())],
-        metadatas={"time": str(datetime.now())}
-    )
-
-def search_conversations(query):
-    try:
-        results = conversation_memory.query(query_texts=[query], n_results=4)
-        if results["documents"][0]:
-            return "Past conversations:\n" + "\n---\n".join(results["documents"][0])
-    except:
-        pass
-    return ""
-
-def search_facts(query):
-    try:
-        results = facts_memory.query(query_texts=[query], n_results=3)
-        if results["documents"][0]:
-            return "\n".join(results["documents"][0])
-    except:
-        pass
-    return ""
-
 def call_groq(messages):
     response = groq_client.chat.completions.create(
         model="llama-3.3-70b-versatile",
@@ -455,8 +421,12 @@ def list_github_repos():
         return "Error: " + str(e)
 
 def think(user_message):
-    past_convos = search_conversations(user_message)
-    known_facts = search_facts(user_message)
+    # Skip memory entirely for obvious commands like "volume up"
+    recall, recall_reason = should_recall(user_message, fast_intent(user_message))
+    recall_stats = {}
+    started = time.perf_counter()
+    past_convos, known_facts = recall_memory(user_message, recall_stats) if recall else ("", "")
+    recall_ms = (time.perf_counter() - started) * 1000
     memory_context = ""
     if known_facts:
         memory_context += "\nKnown facts:\n" + known_facts + "\n"
@@ -526,6 +496,10 @@ def think(user_message):
             reply = api_func(messages)
             api_stats[api_name]["calls"] += 1
             print("Used " + api_name)
+            log_recall(
+                recall_reason, recall, recall_stats, recall_ms,
+                recall_was_useful(memory_context, user_message, reply)
+            )
             decision = _parse_reply(reply)
             # Run through safety classifier
             decision = classify_fallback(user_message, decision)
@@ -533,6 +507,11 @@ def think(user_message):
         except Exception as e:
             api_stats[api_name]["fails"] += 1
             print(api_name + " failed: " + str(e))
+            try:
+                from plugins.api_tracker import record_api_failure
+                record_api_failure(api_name, str(e))
+            except:
+                pass
             continue
 
     return {"action": "CHAT", "value": "All APIs unavailable."}
@@ -553,11 +532,9 @@ def _parse_reply(reply):
     if value_lines:
         value = value + "\n" + "\n".join(value_lines)
     return {"action": action, "value": value}
-def classify_fallback(user_message, decision):
-    # If AI already picked a real action, trust it
-    if decision["action"] != "CHAT":
-        return decision
-
+def fast_intent(user_message):
+    # Cheap keyword match for obvious commands, no AI involved.
+    # Returns a decision dict or None.
     msg = user_message.lower().strip()
 
     # System commands — should always be RUN_COMMAND
@@ -588,7 +565,6 @@ def classify_fallback(user_message, decision):
 
     for keyword, command in command_patterns.items():
         if keyword in msg:
-            print("Classifier override: RUN_COMMAND for: " + keyword)
             return {"action": "RUN_COMMAND", "value": command}
 
     # PC control — should be CONTROL_PC
@@ -599,7 +575,6 @@ def classify_fallback(user_message, decision):
     ]
     for pattern in control_patterns:
         if pattern in msg:
-            print("Classifier override: CONTROL_PC")
             return {"action": "CONTROL_PC", "value": user_message}
 
     # Stats — should be GET_STATS
@@ -609,12 +584,10 @@ def classify_fallback(user_message, decision):
     ]
     for pattern in stats_patterns:
         if pattern in msg:
-            print("Classifier override: GET_STATS")
             return {"action": "GET_STATS", "value": ""}
 
     # Screenshot
     if "screenshot" in msg or "take a screenshot" in msg:
-        print("Classifier override: TAKE_SCREENSHOT")
         return {"action": "TAKE_SCREENSHOT", "value": ""}
 
     # Web search
@@ -624,9 +597,20 @@ def classify_fallback(user_message, decision):
     ]
     for pattern in search_patterns:
         if pattern in msg:
-            print("Classifier override: WEB_SEARCH")
             return {"action": "WEB_SEARCH", "value": user_message}
 
+    return None
+
+def classify_fallback(user_message, decision):
+    # If AI already picked a real action, trust it
+    if decision["action"] != "CHAT":
+        return decision
+
+    intent = fast_intent(user_message)
+    if intent:
+        print("Classifier override: " + intent["action"])
+        return intent
+
     # If still CHAT — keep it, it's probably genuine conversation
     return decision
 
@@ -747,18 +731,43 @@ async def handle_voice(update, context):
         health_status["errors"] += 1
         await send_reply(update, "Voice error: " + str(e))
 
+# Used only while SysWhisper's detectors are missing or stopped
+fallback_alerted = {}
+
+def hard_limit_warnings(anomaly):
+    # The limits live in plugins.anomaly; these are only for when it cannot be imported
+    cpu_limit = anomaly.CPU_ALERT if anomaly else 85
+    ram_limit = anomaly.RAM_ALERT if anomaly else 85
+    disk_limit = anomaly.DISK_ALERT if anomaly else 90
+    now = time.time()
+    # interval=None compares against the previous call instead of blocking
+    cpu = psutil.cpu_percent(interval=None)
+    ram = psutil.virtual_memory()
+    disk = psutil.disk_usage("/")
+    checks = [
+        ("cpu", cpu > cpu_limit, "CPU very high: " + str(cpu) + "%"),
+        ("ram", ram.percent > ram_limit, "RAM very high: " + str(ram.percent) + "%"),
+        ("disk", disk.percent > disk_limit, "Disk almost full: " + str(disk.percent) + "%"),
+    ]
+    warnings = []
+    for key, over, text in checks:
+        if over and now - fallback_alerted.get(key, 0) >= 3600:
+            fallback_alerted[key] = now
+            warnings.append(text)
+    return warnings
+
 async def scheduled_system_check(bot):
+    # SysWhisper's detectors watch the metrics continuously and this
+    # delivers what they found. If they are not running, check the
+    # hard limits here so the alerts never go quiet.
     try:
-        cpu = psutil.cpu_percent(interval=1)
-        ram = psutil.virtual_memory()
-        disk = psutil.disk_usage("/")
-        warnings = []
-        if cpu > 85:
-            warnings.append("CPU very high: " + str(cpu) + "%")
-        if ram.percent > 85:
-            warnings.append("RAM very high: " + str(ram.percent) + "%")
-        if disk.percent > 90:
-            warnings.append("Disk almost full: " + str(disk.percent) + "%")
+        try:
+            from plugins import anomaly
+        except Exception:
+            anomaly = None
+        warnings = anomaly.drain_alerts() if anomaly else []
+        if anomaly is None or not anomaly.detectors_running():
+            warnings += hard_limit_warnings(anomaly)
         if warnings:
             await bot.send_message(chat_id=ALLOWED_USER_ID, text="System Alert\n\n" + "\n".join(warnings))
     except Exception as e:
@@ -801,11 +810,49 @@ async def scheduled_api_check(bot):
     except Exception as e:
         print("API check failed: " + str(e))
 
+async def scheduled_memory_compaction():
+    try:
+        before, removed = await asyncio.to_thread(compact_facts)
+        print("Memory compaction: " + str(removed) + " of " + str(before) + " facts merged")
+    except Exception as e:
+        print("Memory compaction failed: " + str(e))
+
+def summarize_memory_day(date, text):
+    prompt = (
+        "Summarize these conversations from " + date + " between the user and kvchClaw "
+        "as short bullet points. Keep names, files, commands and facts about the user.\n\n"
+        + text[:8000]
+    )
+    summary_messages = [{"role": "user", "content": prompt}]
+    for api_func in [call_groq, call_gemini, call_mistral]:
+        try:
+            return api_func(summary_messages)
+        except:
+            continue
+    return None
+
+async def scheduled_memory_retention(bot):
+    try:
+        report = await asyncio.to_thread(compact_conversations, summarize_memory_day)
+        report += "\n\n" + recall_gate_report(days=7)
+        print(report)
+        await bot.send_message(chat_id=ALLOWED_USER_ID, text=report)
+    except Exception as e:
+        print("Memory retention failed: " + str(e))
+
+async def scheduled_event_retention():
+    try:
+        from plugins.events import apply_retention
+        downsampled, dropped = await asyncio.to_thread(apply_retention)
+        print("Event store: " + str(downsampled) + " events downsampled, " + str(dropped) + " partitions dropped")
+    except Exception as e:
+        print("Event retention failed: " + str(e))
+
 async def post_init(application):
     scheduler = AsyncIOScheduler()
     scheduler.add_job(
         scheduled_system_check, "interval",
-        hours=1, args=[application.bot]
+        seconds=30, args=[application.bot]
     )
     scheduler.add_job(
         scheduled_morning_summary, "cron",
@@ -819,6 +866,18 @@ async def post_init(application):
         scheduled_api_check, "interval",
         hours=3, args=[application.bot]
     )
+    scheduler.add_job(
+        scheduled_memory_compaction, "cron",
+        hour=4, minute=0
+    )
+    scheduler.add_job(
+        scheduled_event_retention, "cron",
+        hour=4, minute=15
+    )
+    scheduler.add_job(
+        scheduled_memory_retention, "cron",
+        day_of_week="sun", hour=4, minute=30, args=[application.bot]
+    )
     scheduler.start()
     print("Scheduler running")
 
@@ -0,0 +1,588 @@
+# -*- coding: utf-8 -*-
+# memory_store.py
+# Long term memory for kvchClaw
+# Conversations and facts live in chromadb, mirrored into a SQLite
+# FTS5 index. Recall tries BM25 first and only embeds the user
+# message when the lexical hits are weak.
+
+import os
+import re
+import time
+import hashlib
+import threading
+import chromadb
+import numpy as np
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from chromadb.utils import embedding_functions
+from dotenv import load_dotenv
+from plugins import storage
+
+load_dotenv()
+
+MEMORY_PATH = "./memory"
+LEXICAL_DB_PATH = "./memory_fts.db"
+EMBED_CACHE_SIZE = 256
+
+# Facts this similar (cosine) are treated as the same fact by compaction
+FACT_MERGE_THRESHOLD = 0.92
+
+# Retention tiers for conversations:
+#   newer than MEMORY_VERBATIM_DAYS  -> kept word for word
+#   older                            -> also summarized into one digest per day
+#   older than MEMORY_PRUNE_DAYS     -> raw entries deleted, only the digest stays
+MEMORY_VERBATIM_DAYS = int(os.getenv("MEMORY_VERBATIM_DAYS", "14"))
+MEMORY_PRUNE_DAYS = int(os.getenv("MEMORY_PRUNE_DAYS", "90"))
+REBUILD_BATCH = 500
+
+# Recall sizes per collection, and how many lexical hits are enough
+# to skip the vector search entirely
+RECALL_LIMITS = {"conversations": 4, "facts": 3}
+LEXICAL_ENOUGH = {"conversations": 2, "facts": 1}
+# bm25() is negative, closer to zero is weaker. Hits scoring above
+# -LEXICAL_MIN_SCORE only matched common words and are treated as noise.
+LEXICAL_MIN_SCORE = 2.0
+
+# Phrases that mean the user is asking about the past or about themselves
+MEMORY_CUES = [
+    "remember", "recall", "last time", "earlier", "before", "yesterday",
+    "again", "what did i", "what was", "did we", "who am i", "my name",
+    "do you know", "you said", "we talked", "i told"
+]
+# Messages shorter than this (in words) skip recall unless they carry a cue
+RECALL_MIN_WORDS = 4
+# fast_intent matches substrings anywhere, so it only skips recall for
+# messages about this long, which are essentially the command itself
+COMMAND_MAX_WORDS = 3
+
+STOPWORDS = set(
+    "a an and are as at be but by can do for from how i in is it me my of on "
+    "or so that the this to was what when where which who why with you your".split()
+)
+
+CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+# Same model chromadb uses by default, created once so we can
+# embed queries ourselves instead of letting every query() do it
+embedding_fn = embedding_functions.DefaultEmbeddingFunction()
+
+# Names used while the conversations collection is rebuilt
+REBUILD_NAME = "conversations_rebuild"
+BACKUP_NAME = "conversations_backup"
+
+memory_client = chromadb.PersistentClient(path=MEMORY_PATH)
+
+def recover_conversations():
+    # A rebuild interrupted by a crash leaves its temporary collections
+    # behind. The backup is the last complete copy of the live data:
+    # put it back if "conversations" is missing, otherwise drop it.
+    # A leftover rebuild copy is only used if nothing else survived.
+    names = set(getattr(c, "name", c) for c in memory_client.list_collections())
+    if BACKUP_NAME in names:
+        if "conversations" in names:
+            memory_client.delete_collection(BACKUP_NAME)
+        else:
+            memory_client.get_collection(BACKUP_NAME, embedding_function=embedding_fn).modify(name="conversations")
+            names.add("conversations")
+    if REBUILD_NAME in names:
+        if "conversations" in names:
+            memory_client.delete_collection(REBUILD_NAME)
+        else:
+            memory_client.get_collection(REBUILD_NAME, embedding_function=embedding_fn).modify(name="conversations")
+
+recover_conversations()
+conversation_memory = memory_client.get_or_create_collection(
+    "conversations", embedding_function=embedding_fn
+)
+facts_memory = memory_client.get_or_create_collection(
+    "facts", embedding_function=embedding_fn
+)
+
+# Both collection lookups run side by side
+recall_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="recall")
+
+# Held while the conversations collection is rebuilt, so no save lands
+# in the old copy after it was read
+rebuild_lock = threading.Lock()
+# Held while conversation_memory is queried or swapped, so a rebuild
+# never renames or deletes the collection under a running query
+swap_lock = threading.Lock()
+
+# ── IDs ───────────────────────────────────────────────────
+def new_ulid():
+    # 48 bit millisecond time + 80 random bits, Crockford base32.
+    # Sorts by creation time and never collides between threads.
+    value = (int(time.time() * 1000) << 80) | int.from_bytes(os.urandom(10), "big")
+    chars = []
+    for _ in range(26):
+        chars.append(CROCKFORD[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+def normalize_fact(text):
+    return " ".join(text.lower().split()).rstrip(".!")
+
+def fact_id(text):
+    # Same fact, same id — upsert then replaces instead of duplicating
+    return "fact-" + hashlib.sha1(normalize_fact(text).encode("utf-8")).hexdigest()
+
+# ── Writes ────────────────────────────────────────────────
+def save_conversation(user_msg, bot_reply):
+    now = datetime.now()
+    document = "User: " + user_msg + "\nkvchClaw: " + bot_reply
+    doc_id = "conv-" + new_ulid()
+    with rebuild_lock:
+        conversation_memory.upsert(
+            documents=[document],
+            ids=[doc_id],
+            metadatas=[{"time": str(now), "date": now.strftime("%Y-%m-%d")}]
+        )
+    index_documents("conversations", [doc_id], [document])
+
+def save_fact(text):
+    document = text.strip()
+    doc_id = fact_id(text)
+    facts_memory.upsert(
+        documents=[document],
+        ids=[doc_id],
+        metadatas=[{"time": str(datetime.now())}]
+    )
+    index_documents("facts", [doc_id], [document])
+
+# ── Lexical Index ─────────────────────────────────────────
+# FTS5 rows are keyed by an integer rowid. memory_docs maps each doc id
+# to it, so replacing or removing a document is a primary key lookup
+# instead of a scan of the UNINDEXED doc_id column.
+def create_lexical_tables(c):
+    c.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS memory_fts USING fts5(
+            doc_id UNINDEXED,
+            collection UNINDEXED,
+            content
+        )
+    """)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS recall_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts INTEGER,
+            reason TEXT,
+            recalled INTEGER,
+            lexical_hits INTEGER,
+            vector_hits INTEGER,
+            latency_ms REAL,
+            useful INTEGER
+        )
+    """)
+
+def create_doc_rowids(c):
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS memory_docs (
+            id INTEGER PRIMARY KEY,
+            doc_id TEXT UNIQUE NOT NULL
+        )
+    """)
+    # Rows indexed before the mapping existed keep their rowids
+    c.execute("INSERT OR IGNORE INTO memory_docs (id, doc_id) SELECT rowid, doc_id FROM memory_fts")
+
+def init_lexical_index():
+    storage.migrate(LEXICAL_DB_PATH, [create_lexical_tables, create_doc_rowids])
+
+def _remove_rows(conn, ids):
+    for doc_id in ids:
+        row = conn.execute("SELECT id FROM memory_docs WHERE doc_id = ?", (doc_id,)).fetchone()
+        if row:
+            conn.execute("DELETE FROM memory_fts WHERE rowid = ?", row)
+            conn.execute("DELETE FROM memory_docs WHERE id = ?", row)
+
+def index_documents(collection_name, ids, documents):
+    if not ids:
+        return
+    try:
+        with storage.transaction(LEXICAL_DB_PATH) as conn:
+            _remove_rows(conn, ids)
+            for doc_id, document in zip(ids, documents):
+                rowid = conn.execute(
+                    "INSERT INTO memory_docs (doc_id) VALUES (?)", (doc_id,)
+                ).lastrowid
+                conn.execute(
+                    "INSERT INTO memory_fts (rowid, doc_id, collection, content) VALUES (?, ?, ?, ?)",
+                    (rowid, doc_id, collection_name, document)
+                )
+    except Exception as e:
+        print("Memory index error: " + str(e))
+
+def unindex_documents(ids):
+    if not ids:
+        return
+    try:
+        with storage.transaction(LEXICAL_DB_PATH) as conn:
+            _remove_rows(conn, ids)
+    except Exception as e:
+        print("Memory index error: " + str(e))
+
+def optimize_lexical_index():
+    with storage.transaction(LEXICAL_DB_PATH) as conn:
+        conn.execute("INSERT INTO memory_fts (memory_fts) VALUES ('optimize')")
+
+def backfill_lexical_index():
+    # First run after upgrading: copy whatever chromadb already holds
+    indexed = dict(storage.query(
+        LEXICAL_DB_PATH, "SELECT collection, COUNT(*) FROM memory_fts GROUP BY collection"
+    ))
+    for name, collection in [("conversations", conversation_memory), ("facts", facts_memory)]:
+        if indexed.get(name) or collection.count() == 0:
+            continue
+        data = collection.get(include=["documents"])
+        index_documents(name, data["ids"], data["documents"])
+
+def build_match_query(text):
+    # Every term is quoted as its own phrase, so "main.py" or an IP
+    # must match its parts side by side instead of anywhere in the doc
+    terms = []
+    for term in re.findall(r"[\w.\-/:@]+", text.lower()):
+        term = term.strip(".-/:@")
+        if len(term) < 2 or term in STOPWORDS or term in terms:
+            continue
+        terms.append(term)
+    return " OR ".join('"' + t.replace('"', '""') + '"' for t in terms[:16])
+
+def _lexical_documents(collection_name, match, n_results):
+    if not match:
+        return []
+    try:
+        rows = storage.query(LEXICAL_DB_PATH, """
+            SELECT content, bm25(memory_fts) AS score
+            FROM memory_fts
+            WHERE memory_fts MATCH ? AND collection = ?
+            ORDER BY score
+            LIMIT ?
+        """, (match, collection_name, n_results))
+    except Exception as e:
+        print("Memory lexical search error: " + str(e))
+        return []
+    return [content for content, score in rows if -score >= LEXICAL_MIN_SCORE]
+
+init_lexical_index()
+backfill_lexical_index()
+
+# ── Embeddings ────────────────────────────────────────────
+@lru_cache(maxsize=EMBED_CACHE_SIZE)
+def _embed_cached(text):
+    # Tuples are hashable and immutable, safe to share from the cache
+    return tuple(float(x) for x in embedding_fn([text])[0])
+
+def embed_query(text):
+    return list(_embed_cached(text.strip()))
+
+# ── Recall ────────────────────────────────────────────────
+def _query_documents(collection, embedding, n_results):
+    try:
+        results = collection.query(query_embeddings=[embedding], n_results=n_results)
+        return results["documents"][0] or []
+    except:
+        return []
+
+def _query_conversations(embedding, n_results):
+    with swap_lock:
+        return _query_documents(conversation_memory, embedding, n_results)
+
+def _query_facts(embedding, n_results):
+    return _query_documents(facts_memory, embedding, n_results)
+
+def should_recall(message, intent=None):
+    """
+    Decides whether memory is worth querying for this message.
+    intent is the fast-path decision from main.fast_intent, if any. It
+    only counts for short messages — "open firefox", not "how do I open
+    a file in python".
+    Returns (recall, reason) — reason is logged so the gate can be tuned.
+    """
+    msg = message.lower().strip()
+    if any(cue in msg for cue in MEMORY_CUES):
+        return True, "cue"
+    if intent and len(msg.split()) <= COMMAND_MAX_WORDS:
+        return False, "command"
+    if len(msg.split()) < RECALL_MIN_WORDS and not msg.endswith("?"):
+        return False, "short"
+    return True, "default"
+
+def _merge_documents(first, second, limit):
+    merged = list(first)
+    for doc in second:
+        if doc not in merged:
+            merged.append(doc)
+    return merged[:limit]
+
+def format_conversations(docs):
+    if docs:
+        return "Past conversations:\n" + "\n---\n".join(docs)
+    return ""
+
+def format_facts(docs):
+    return "\n".join(docs)
+
+def recall_memory(query, stats=None):
+    """
+    Returns (past_conversations, known_facts) for the system prompt.
+    BM25 hits come first. Only collections without enough strong
+    lexical hits fall back to vector search, which embeds the query
+    once and searches them in parallel.
+    Hit counts are written into stats if a dict is passed.
+    """
+    match = build_match_query(query)
+    docs = {}
+    weak = []
+    lexical_hits = 0
+    for name in ["conversations", "facts"]:
+        docs[name] = _lexical_documents(name, match, RECALL_LIMITS[name])
+        lexical_hits += len(docs[name])
+        if len(docs[name]) < LEXICAL_ENOUGH[name]:
+            weak.append(name)
+
+    if weak:
+        try:
+            embedding = embed_query(query)
+            queries = {"conversations": _query_conversations, "facts": _query_facts}
+            futures = {
+                name: recall_pool.submit(queries[name], embedding, RECALL_LIMITS[name])
+                for name in weak
+            }
+            for name, future in futures.items():
+                docs[name] = _merge_documents(docs[name], future.result(), RECALL_LIMITS[name])
+        except Exception as e:
+            print("Memory embed error: " + str(e))
+
+    if stats is not None:
+        stats["lexical_hits"] = lexical_hits
+        stats["vector_hits"] = len(docs["conversations"]) + len(docs["facts"]) - lexical_hits
+    return format_conversations(docs["conversations"]), format_facts(docs["facts"])
+
+# ── Recall Log ────────────────────────────────────────────
+def _terms(text):
+    return set(
+        t for t in re.findall(r"[a-z0-9][a-z0-9.\-_/]{3,}", text.lower())
+        if t not in STOPWORDS
+    )
+
+def recall_was_useful(memory_context, user_message, reply):
+    # Memory counts as used when the reply mentions something that
+    # came from memory and was not already in the user's message
+    if not memory_context:
+        return False
+    recalled = _terms(memory_context) - _terms(user_message)
+    return bool(recalled & _terms(reply))
+
+def log_recall(reason, recalled, stats, latency_ms, useful):
+    try:
+        with storage.transaction(LEXICAL_DB_PATH) as conn:
+            conn.execute("""
+                INSERT INTO recall_log
+                (ts, reason, recalled, lexical_hits, vector_hits, latency_ms, useful)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (
+                int(time.time()), reason, int(recalled),
+                stats.get("lexical_hits", 0), stats.get("vector_hits", 0),
+                round(latency_ms, 2), int(useful)
+            ))
+    except Exception as e:
+        print("Recall log error: " + str(e))
+
+def recall_gate_report(days=7):
+    rows = storage.query(LEXICAL_DB_PATH, """
+        SELECT reason, COUNT(*), AVG(latency_ms), SUM(useful), SUM(recalled)
+        FROM recall_log
+        WHERE ts > ?
+        GROUP BY reason
+        ORDER BY COUNT(*) DESC
+    """, (int(time.time()) - days * 86400,))
+    if not rows:
+        return "Recall gate: no messages logged yet"
+    lines = ["Recall gate (last " + str(days) + " days):"]
+    for reason, count, latency, useful, recalled in rows:
+        line = reason + ": " + str(count) + " msgs"
+        if recalled:
+            line += ", avg " + str(round(latency or 0, 1)) + "ms"
+            line += ", useful " + str(round(100 * (useful or 0) / recalled)) + "%"
+        else:
+            line += ", skipped"
+        lines.append(line)
+    return "\n".join(lines)
+
+# ── Compaction ────────────────────────────────────────────
+def compact_facts(threshold=FACT_MERGE_THRESHOLD):
+    """
+    Merges near-duplicate facts, keeping the newest wording.
+    Returns (facts_before, facts_removed).
+    """
+    data = facts_memory.get(include=["documents", "metadatas", "embeddings"])
+    ids = data["ids"]
+    if len(ids) < 2:
+        return len(ids), 0
+
+    # Newest first so the latest phrasing of a fact survives
+    order = sorted(
+        range(len(ids)),
+        key=lambda i: (data["metadatas"][i] or {}).get("time", ""),
+        reverse=True
+    )
+    vectors = np.array([data["embeddings"][i] for i in order], dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.maximum(norms, 1e-12)
+
+    removed = np.zeros(len(order), dtype=bool)
+    for pos in range(len(order) - 1):
+        if removed[pos]:
+            continue
+        sims = vectors[pos + 1:] @ vectors[pos]
+        removed[pos + 1:] |= sims >= threshold
+
+    stale_ids = [ids[order[pos]] for pos in range(len(order)) if removed[pos]]
+    if stale_ids:
+        facts_memory.delete(ids=stale_ids)
+        unindex_documents(stale_ids)
+    return len(ids), len(stale_ids)
+
+def _memory_size_bytes():
+    total = 0
+    for root, dirs, files in os.walk(MEMORY_PATH):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+def _query_latency_ms(probes):
+    if not probes:
+        return 0.0
+    start = time.perf_counter()
+    for embedding in probes:
+        _query_documents(conversation_memory, embedding, 4)
+    return (time.perf_counter() - start) * 1000 / len(probes)
+
+def _fallback_digest(date, documents):
+    # No LLM available: keep what the user asked, that is what recall needs
+    asks = []
+    for doc in documents:
+        first = doc.split("\n", 1)[0]
+        if first.startswith("User: "):
+            asks.append("- " + first[6:][:200])
+    return "\n".join(asks[:40])
+
+def _build_digests(data, cutoff, summarize):
+    # Returns [(date, document)] for every day before cutoff without a
+    # digest yet. Makes one summarize call per day, so it runs unlocked.
+    digested = set(
+        meta.get("date") for meta in data["metadatas"]
+        if meta and meta.get("kind") == "digest"
+    )
+    by_date = {}
+    for doc, meta in zip(data["documents"], data["metadatas"]):
+        meta = meta or {}
+        date = meta.get("date")
+        if not date or meta.get("kind") == "digest" or date >= cutoff or date in digested:
+            continue
+        by_date.setdefault(date, []).append(doc)
+
+    digests = []
+    for date, documents in sorted(by_date.items()):
+        summary = None
+        if summarize:
+            try:
+                summary = summarize(date, "\n---\n".join(documents))
+            except Exception as e:
+                print("Memory digest summarize failed: " + str(e))
+        if not summary:
+            summary = _fallback_digest(date, documents)
+        digests.append((date, "Conversation digest for " + date + ":\n" + summary))
+    return digests
+
+def _write_digests(digests):
+    for date, document in digests:
+        conversation_memory.upsert(
+            documents=[document],
+            ids=["digest-" + date],
+            metadatas=[{"time": str(datetime.now()), "date": date, "kind": "digest"}]
+        )
+        index_documents("conversations", ["digest-" + date], [document])
+
+def _rebuild_conversations():
+    # Copy into a fresh collection so the HNSW index drops every
+    # deleted entry, then swap it in under the original name
+    global conversation_memory
+    data = conversation_memory.get(include=["documents", "metadatas", "embeddings"])
+    try:
+        memory_client.delete_collection(REBUILD_NAME)
+    except Exception:
+        pass
+    fresh = memory_client.create_collection(
+        REBUILD_NAME, embedding_function=embedding_fn
+    )
+    for start in range(0, len(data["ids"]), REBUILD_BATCH):
+        end = start + REBUILD_BATCH
+        fresh.add(
+            ids=data["ids"][start:end],
+            documents=data["documents"][start:end],
+            metadatas=data["metadatas"][start:end],
+            embeddings=[list(e) for e in data["embeddings"][start:end]]
+        )
+    # The live data is only renamed, never deleted, until the new copy
+    # is in place — recover_conversations() can finish the job after a crash
+    with swap_lock:
+        conversation_memory.modify(name=BACKUP_NAME)
+        fresh.modify(name="conversations")
+        conversation_memory = fresh
+    memory_client.delete_collection(BACKUP_NAME)
+
+def compact_conversations(summarize=None):
+    """
+    Applies the retention tiers and rebuilds the conversation index.
+    summarize(date, text) may return a digest string; without it the
+    digest falls back to the list of things the user asked that day.
+    Returns a short report with size and query latency before and after.
+    """
+    now = datetime.now()
+    verbatim_cutoff = (now - timedelta(days=MEMORY_VERBATIM_DAYS)).strftime("%Y-%m-%d")
+    prune_cutoff = (now - timedelta(days=MEMORY_PRUNE_DAYS)).strftime("%Y-%m-%d")
+
+    # Digests only cover days before the verbatim cutoff, which new saves
+    # never touch, so the slow summarize calls run from a snapshot while
+    # save_conversation carries on. The lock is held for the writes and
+    # the rebuild only.
+    data = conversation_memory.get(include=["documents", "metadatas", "embeddings"])
+    probes = [list(e) for e in data["embeddings"][:5]]
+    size_before = _memory_size_bytes()
+    latency_before = _query_latency_ms(probes)
+    count_before = len(data["ids"])
+
+    digests = _build_digests(data, verbatim_cutoff, summarize)
+
+    stale_ids = [
+        doc_id for doc_id, meta in zip(data["ids"], data["metadatas"])
+        if meta and meta.get("kind") != "digest"
+        and meta.get("date") and meta["date"] < prune_cutoff
+    ]
+
+    with rebuild_lock:
+        _write_digests(digests)
+        for start in range(0, len(stale_ids), REBUILD_BATCH):
+            conversation_memory.delete(ids=stale_ids[start:start + REBUILD_BATCH])
+        unindex_documents(stale_ids)
+
+        _rebuild_conversations()
+
+    optimize_lexical_index()
+    size_after = _memory_size_bytes()
+    latency_after = _query_latency_ms(probes)
+    count_after = conversation_memory.count()
+
+    return (
+        "Memory compaction\n"
+        "Conversations: " + str(count_before) + " -> " + str(count_after) + "\n"
+        "Digests written: " + str(len(digests)) + ", raw entries pruned: " + str(len(stale_ids)) + "\n"
+        "Store size: " + str(round(size_before / 1024 / 1024, 1)) + "MB -> "
+        + str(round(size_after / 1024 / 1024, 1)) + "MB\n"
+        "Query latency: " + str(round(latency_before, 1)) + "ms -> "
+        + str(round(latency_after, 1)) + "ms"
+    )
@@ -0,0 +1,174 @@
+# plugins/anomaly.py
+# Online anomaly detection for the system monitors
+# Every detector updates in constant time per sample from running
+# state (EWMA mean/variance, streak counters, known peers), so nothing
+# re-reads history. Memory leaks come from SysWhisper's process_trends
+# fits instead, which survive restarts. Alerts are queued here
+# and main.py pushes them to Telegram.
+
+import math
+import time
+import threading
+from collections import deque
+from plugins import events
+
+# Hard limits that alert whatever the learned baseline says
+CPU_ALERT = 85
+RAM_ALERT = 85
+DISK_ALERT = 90
+
+# How many standard deviations above its usual level counts as unusual
+Z_THRESHOLD = 3.0
+
+# The same alert is not repeated within this many seconds
+ALERT_COOLDOWN = 3600
+
+# A process using this much of one core for HOG_SECONDS is a hog
+HOG_PERCENT = 80
+HOG_SECONDS = 300
+
+# A detector loop that has not reported for this long counts as stopped,
+# and main.py falls back to its own hard-limit check
+DETECTOR_STALE_SECONDS = 120
+
+# Apps are watched for new peers once known for this long. Apps that
+# talk to more than PEER_MAX_KNOWN hosts (browsers) are not watched.
+PEER_LEARN_SECONDS = 86400
+PEER_MAX_KNOWN = 20
+
+# ── Alerts ────────────────────────────────────────────────
+alerts = deque(maxlen=50)
+last_alert = {}
+alert_lock = threading.Lock()
+
+def raise_alert(key, text, now=None):
+    """Queues text for Telegram unless key alerted within ALERT_COOLDOWN."""
+    now = now or time.time()
+    with alert_lock:
+        if now - last_alert.get(key, 0) < ALERT_COOLDOWN:
+            return False
+        last_alert[key] = now
+        alerts.append(text)
+    events.record("alert", key, payload=text, ts=now)
+    return True
+
+def drain_alerts():
+    with alert_lock:
+        pending = list(alerts)
+        alerts.clear()
+    return pending
+
+# ── Heartbeats ────────────────────────────────────────────
+last_run = {}
+
+def heartbeat(name, now=None):
+    last_run[name] = now or time.time()
+
+def detectors_running(now=None):
+    """True once the detector loops have reported and none has gone quiet."""
+    now = now or time.time()
+    runs = list(last_run.values())
+    return bool(runs) and all(now - ts < DETECTOR_STALE_SECONDS for ts in runs)
+
+# ── Detectors ─────────────────────────────────────────────
+class Ewma:
+    """Exponentially weighted running mean and variance."""
+
+    def __init__(self, alpha=0.01, warmup=60):
+        self.alpha = alpha
+        self.warmup = warmup
+        self.mean = None
+        self.var = 0.0
+        self.n = 0
+
+    def zscore(self, x):
+        if self.n < self.warmup or self.var <= 0:
+            return None
+        return (x - self.mean) / math.sqrt(self.var)
+
+    def update(self, x, alpha=None):
+        alpha = self.alpha if alpha is None else alpha
+        self.n += 1
+        if self.mean is None:
+            self.mean = x
+            return
+        diff = x - self.mean
+        incr = alpha * diff
+        self.mean += incr
+        self.var = (1 - alpha) * (self.var + diff * incr)
+
+class StreamDetector:
+    """
+    Flags a metric that stays unusual for `sustain` samples in a row:
+    either above hard_limit, or above floor and Z_THRESHOLD deviations
+    over its EWMA baseline. Unusual samples barely move the baseline,
+    so a long spike is not learned as normal within minutes.
+    """
+
+    def __init__(self, label, floor, hard_limit, sustain, alpha=0.01, warmup=60):
+        self.label = label
+        self.floor = floor
+        self.hard_limit = hard_limit
+        self.sustain = sustain
+        self.baseline = Ewma(alpha, warmup)
+        self.streak = 0
+
+    def update(self, value):
+        """Returns an alert message when the streak reaches `sustain`."""
+        if value is None:
+            return None
+        z = self.baseline.zscore(value)
+        unusual = value >= self.hard_limit or (
+            z is not None and z > Z_THRESHOLD and value >= self.floor
+        )
+        self.baseline.update(value, self.baseline.alpha / 10 if unusual else None)
+        self.streak = self.streak + 1 if unusual else 0
+        if self.streak != self.sustain:
+            return None
+        usual = round(self.baseline.mean, 1)
+        return self.label + " at " + str(round(value, 1)) + "% (usually about " + str(usual) + "%)"
+
+class HogDetector:
+    """Processes that keep one core busy for HOG_SECONDS."""
+
+    def __init__(self):
+        # (pid, start_time) -> first time it was seen above HOG_PERCENT
+        self.busy_since = {}
+
+    def update(self, processes, now):
+        found = []
+        current = {}
+        for p in processes:
+            key = (p["pid"], p["start_time"])
+            if p["cpu_percent"] < HOG_PERCENT:
+                continue
+            since = self.busy_since.get(key, now)
+            current[key] = since
+            if now - since >= HOG_SECONDS:
+                found.append((p, int((now - since) / 60)))
+        self.busy_since = current
+        return found
+
+class PeerDetector:
+    """Apps that normally talk to a few hosts connecting somewhere new."""
+
+    def __init__(self, now=None):
+        self.started = now or time.time()
+        self.known = {}
+        self.first_seen = {}
+
+    def seed(self, app, ip, ts):
+        self.known.setdefault(app, set()).add(ip)
+        self.first_seen[app] = min(self.first_seen.get(app, ts), ts)
+
+    def update(self, connections, now):
+        found = []
+        for app, ip in connections:
+            peers = self.known.setdefault(app, set())
+            first = self.first_seen.setdefault(app, now)
+            if ip in peers:
+                continue
+            if now - first >= PEER_LEARN_SECONDS and 0 < len(peers) <= PEER_MAX_KNOWN:
+                found.append((app, ip))
+            peers.add(ip)
+        return found
@@ -3,12 +3,12 @@
 # Tracks Groq, Gemini, Mistral free tier usage
 # Warns before you hit limits
 
-import os
-import sqlite3
 from datetime import datetime, timedelta
 from plugins.base import Plugin
+from plugins import storage
+from plugins import events
 
-DB_PATH = os.path.expanduser("~/myclaw/api_tracker.db")
+DB_PATH = storage.db_path("api_tracker.db")
 
 # Free tier limits
 API_LIMITS = {
@@ -19,9 +19,7 @@ API_LIMITS = {
 }
 
 # ── Database ──────────────────────────────────────────────
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+def create_tables(c):
     c.execute("""
         CREATE TABLE IF NOT EXISTS api_usage (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -40,85 +38,82 @@ def init_db():
             UNIQUE(date, api_name)
         )
     """)
-    conn.commit()
-    conn.close()
+
+def init_db():
+    storage.migrate(DB_PATH, [create_tables])
 
 init_db()
 
+# Calls are recorded on the reply path, so they are queued and
+# committed in batches instead of blocking the reply
+writes = storage.writer(DB_PATH)
+
 # ── Track Usage ───────────────────────────────────────────
 def record_api_call(api_name: str, tokens: int = 0):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
         today = datetime.now().strftime("%Y-%m-%d")
         now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
         # Insert raw call
-        c.execute("""
+        writes.put("""
             INSERT INTO api_usage (timestamp, date, api_name, tokens_used)
             VALUES (?, ?, ?, ?)
         """, (now, today, api_name, tokens))
 
         # Update daily summary
-        c.execute("""
+        writes.put("""
             INSERT INTO daily_summary (date, api_name, total_calls)
             VALUES (?, ?, 1)
             ON CONFLICT(date, api_name)
             DO UPDATE SET total_calls = total_calls + 1
         """, (today, api_name))
+    except Exception as e:
+        print("API tracker error: " + str(e))
 
-        conn.commit()
-        conn.close()
+def record_api_failure(api_name: str, error: str = ""):
+    # Only kept in the event store, where it can be lined up
+    # with whatever else was happening at the time
+    try:
+        events.record("api_error", api_name, payload={"error": error[:300]})
     except Exception as e:
         print("API tracker error: " + str(e))
 
 # ── Query Usage ───────────────────────────────────────────
 def get_today_usage():
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
+        writes.flush()
         today = datetime.now().strftime("%Y-%m-%d")
-        c.execute("""
+        rows = storage.query(DB_PATH, """
             SELECT api_name, total_calls
             FROM daily_summary
             WHERE date = ?
         """, (today,))
-        rows = c.fetchall()
-        conn.close()
         return {row[0]: row[1] for row in rows}
     except:
         return {}
 
 def get_week_usage():
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
+        writes.flush()
         week_ago = (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d")
-        c.execute("""
+        return storage.query(DB_PATH, """
             SELECT date, api_name, total_calls
             FROM daily_summary
             WHERE date >= ?
             ORDER BY date DESC
         """, (week_ago,))
-        rows = c.fetchall()
-        conn.close()
-        return rows
     except:
         return []
 
 def get_hourly_usage(api_name: str):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
+        writes.flush()
         hour_ago = (datetime.now() - timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S")
-        c.execute("""
+        return storage.query_one(DB_PATH, """
             SELECT COUNT(*)
             FROM api_usage
             WHERE api_name = ? AND timestamp >= ?
-        """, (api_name, hour_ago))
-        count = c.fetchone()[0]
-        conn.close()
-        return count
+        """, (api_name, hour_ago))[0]
     except:
         return 0
 
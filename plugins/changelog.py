@@ -2,16 +2,27 @@
 # Personal Changelog Plugin
 # Watches your project folders and auto-generates
 # a daily summary of everything you worked on
+# Uses inotify when available, periodic rescans otherwise
 
 import os
-import sqlite3
+import re
 import subprocess
 import threading
 import time
+import zlib
+from array import array
+from collections import Counter
 from datetime import datetime, timedelta
 from plugins.base import Plugin
+from plugins import scanner
+from plugins import storage
 
-DB_PATH = os.path.expanduser("~/myclaw/changelog.db")
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+DB_PATH = storage.db_path("changelog.db")
 
 # Folders to watch — customize these
 WATCH_FOLDERS = [
@@ -30,36 +41,279 @@ TRACK_EXTENSIONS = [
     ".sh", ".sql", ".php", ".rb"
 ]
 
+# Folders never worth walking or watching
+SKIP_DIRS = ["venv", "node_modules", "__pycache__", ".git"]
+
+# Seconds a file must be quiet before its edits are recorded
+DEBOUNCE_SECONDS = 5
+
+# Raw file_activity rows older than this are deleted. Reports read
+# the daily rollups, which are kept forever.
+RAW_RETENTION_DAYS = 90
+
+# Hash file contents when mtime or size moves, so a save that changed
+# nothing is not counted as an edit and line deltas can be reported
+HASH_CONTENTS = True
+# Bigger files are judged by size and mtime only
+MAX_HASH_BYTES = 4 * 1024 * 1024
+
 # ── Database ──────────────────────────────────────────────
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+def connect():
+    return storage.connect(DB_PATH)
+
+def migrate_epoch_timestamps(c):
+    # Schema 0 stored local time as TEXT. Rebuild both tables with
+    # integer epoch seconds, dropping the duplicate commits that the
+    # old scanner inserted on every pass.
+    c.execute("ALTER TABLE file_activity RENAME TO file_activity_old")
+    c.execute("ALTER TABLE git_commits RENAME TO git_commits_old")
+    c.execute("DROP INDEX IF EXISTS idx_git_commits_hash")
+    create_tables(c)
+    c.execute("""
+        INSERT INTO file_activity (id, ts, filepath, filename, project, action, size_bytes)
+        SELECT id, CAST(strftime('%s', timestamp, 'utc') AS INTEGER),
+               filepath, filename, project, action, size_bytes
+        FROM file_activity_old
+        WHERE timestamp IS NOT NULL
+    """)
+    c.execute("""
+        INSERT INTO git_commits (id, ts, repo, message, files_changed, hash)
+        SELECT id, CAST(strftime('%s', timestamp, 'utc') AS INTEGER),
+               repo, message, files_changed, hash
+        FROM git_commits_old
+        WHERE id IN (
+            SELECT MIN(id) FROM git_commits_old
+            GROUP BY repo, message, COALESCE(hash, '')
+        )
+    """)
+    c.execute("DROP TABLE file_activity_old")
+    c.execute("DROP TABLE git_commits_old")
+
+def create_tables(c):
     c.execute("""
         CREATE TABLE IF NOT EXISTS file_activity (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT,
+            ts INTEGER NOT NULL,
             filepath TEXT,
             filename TEXT,
             project TEXT,
             action TEXT,
-            size_bytes INTEGER
+            size_bytes INTEGER,
+            lines_added INTEGER,
+            lines_removed INTEGER
         )
     """)
+    # Commits are keyed by hash so re-reading a repo never duplicates them
     c.execute("""
         CREATE TABLE IF NOT EXISTS git_commits (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT,
+            ts INTEGER NOT NULL,
             repo TEXT,
             message TEXT,
-            files_changed INTEGER
+            files_changed INTEGER,
+            hash TEXT
         )
     """)
-    conn.commit()
-    conn.close()
+
+def add_missing_columns(c, table, columns):
+    existing = [row[1] for row in c.execute("PRAGMA table_info(" + table + ")").fetchall()]
+    for name, kind in columns:
+        if name not in existing:
+            c.execute("ALTER TABLE " + table + " ADD COLUMN " + name + " " + kind)
+
+def create_schema(c):
+    # Safe to run on every start, only adds what is missing
+    create_tables(c)
+    add_missing_columns(c, "file_activity", [
+        ("lines_added", "INTEGER"), ("lines_removed", "INTEGER")
+    ])
+    # Covers the report query, so a time range never touches the table
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_file_activity_ts
+        ON file_activity (ts, project, filename, action)
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_file_activity_project_ts ON file_activity (project, ts)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_git_commits_ts ON git_commits (ts)")
+    c.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_git_commits_hash
+        ON git_commits (hash)
+    """)
+    # Edits per day, project and file — updated on every save so
+    # reports never have to aggregate the raw rows
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS file_activity_daily (
+            day TEXT,
+            project TEXT,
+            filename TEXT,
+            action TEXT,
+            edits INTEGER,
+            lines_added INTEGER DEFAULT 0,
+            lines_removed INTEGER DEFAULT 0,
+            PRIMARY KEY (day, project, filename, action)
+        )
+    """)
+    add_missing_columns(c, "file_activity_daily", [
+        ("lines_added", "INTEGER DEFAULT 0"), ("lines_removed", "INTEGER DEFAULT 0")
+    ])
+    # Lets a report list a project's recent files without aggregating them
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_file_activity_daily_project
+        ON file_activity_daily (project, action, day)
+    """)
+    # The same per day and project, one row each, so report totals read
+    # days x projects rows. files counts distinct files touched that day.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS project_activity_daily (
+            day TEXT,
+            project TEXT,
+            files INTEGER,
+            edits INTEGER,
+            lines_added INTEGER,
+            lines_removed INTEGER,
+            PRIMARY KEY (day, project)
+        )
+    """)
+    # Triggers keep it in step with every write to file_activity_daily
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS file_activity_daily_insert
+        AFTER INSERT ON file_activity_daily
+        BEGIN
+            INSERT INTO project_activity_daily
+            (day, project, files, edits, lines_added, lines_removed)
+            VALUES (
+                NEW.day, NEW.project,
+                (SELECT COUNT(*) = 1 FROM file_activity_daily
+                 WHERE day = NEW.day AND project = NEW.project AND filename = NEW.filename),
+                NEW.edits, NEW.lines_added, NEW.lines_removed
+            )
+            ON CONFLICT (day, project) DO UPDATE SET
+                files = files + excluded.files,
+                edits = edits + excluded.edits,
+                lines_added = lines_added + excluded.lines_added,
+                lines_removed = lines_removed + excluded.lines_removed;
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS file_activity_daily_update
+        AFTER UPDATE ON file_activity_daily
+        BEGIN
+            UPDATE project_activity_daily SET
+                edits = edits + NEW.edits - OLD.edits,
+                lines_added = lines_added + NEW.lines_added - OLD.lines_added,
+                lines_removed = lines_removed + NEW.lines_removed - OLD.lines_removed
+            WHERE day = NEW.day AND project = NEW.project;
+        END
+    """)
+    # Last seen state of every tracked file and watched directory,
+    # so a restart can diff against it instead of starting blind
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS file_state (
+            filepath TEXT PRIMARY KEY,
+            mtime REAL,
+            size INTEGER,
+            inode INTEGER,
+            hash TEXT,
+            line_hashes BLOB
+        )
+    """)
+    # line_hashes is a packed array of crc32s, one per line
+    add_missing_columns(c, "file_state", [("hash", "TEXT"), ("line_hashes", "BLOB")])
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS dir_state (
+            dirpath TEXT PRIMARY KEY,
+            mtime REAL,
+            subdirs TEXT,
+            files TEXT
+        )
+    """)
+    add_missing_columns(c, "dir_state", [("files", "TEXT")])
+    # Newest commit already ingested for every repo
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS git_repos (
+            repo_path TEXT PRIMARY KEY,
+            last_hash TEXT
+        )
+    """)
+    # Folders added from chat, on top of WATCH_FOLDERS
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS watch_folders (
+            path TEXT PRIMARY KEY,
+            added_ts INTEGER
+        )
+    """)
+
+def upgrade_epoch_timestamps(c):
+    columns = [row[1] for row in c.execute("PRAGMA table_info(file_activity)").fetchall()]
+    if "timestamp" in columns:
+        add_missing_columns(c, "git_commits", [("hash", "TEXT")])
+        migrate_epoch_timestamps(c)
+
+def upgrade_daily_rollup(c):
+    create_schema(c)
+    rebuild_daily_rollup(c)
+
+def upgrade_project_rollup(c):
+    create_schema(c)
+    rebuild_project_rollup(c)
+
+# MIGRATIONS[i] upgrades schema version i to i + 1
+MIGRATIONS = [upgrade_epoch_timestamps, upgrade_daily_rollup, upgrade_project_rollup]
+
+def init_db():
+    storage.migrate(DB_PATH, MIGRATIONS)
+    with storage.transaction(DB_PATH) as conn:
+        create_schema(conn.cursor())
+
+def rebuild_daily_rollup(c):
+    # Schema 1 only rolled rows up when they expired, so every raw row
+    # still present is missing from the rollup. Add them all once.
+    c.execute("""
+        INSERT INTO file_activity_daily
+        (day, project, filename, action, edits, lines_added, lines_removed)
+        SELECT date(ts, 'unixepoch', 'localtime'), project, filename, action, COUNT(*),
+               COALESCE(SUM(lines_added), 0), COALESCE(SUM(lines_removed), 0)
+        FROM file_activity
+        GROUP BY 1, project, filename, action
+        ON CONFLICT (day, project, filename, action)
+        DO UPDATE SET edits = edits + excluded.edits,
+                      lines_added = lines_added + excluded.lines_added,
+                      lines_removed = lines_removed + excluded.lines_removed
+    """)
+
+def rebuild_project_rollup(c):
+    # Recomputed once from the file rollup, the triggers keep it current after that
+    c.execute("DELETE FROM project_activity_daily")
+    c.execute("""
+        INSERT INTO project_activity_daily
+        (day, project, files, edits, lines_added, lines_removed)
+        SELECT day, project, COUNT(DISTINCT filename), SUM(edits),
+               COALESCE(SUM(lines_added), 0), COALESCE(SUM(lines_removed), 0)
+        FROM file_activity_daily
+        GROUP BY day, project
+    """)
+
+def apply_retention(days=RAW_RETENTION_DAYS):
+    """Deletes raw activity older than `days`. The daily rollup keeps its counts."""
+    cutoff = int(time.time() - days * 86400)
+    with storage.transaction(DB_PATH) as conn:
+        removed = conn.execute("DELETE FROM file_activity WHERE ts < ?", (cutoff,)).rowcount
+    conn.execute("PRAGMA optimize")
+    return removed
 
 # ── File Watcher ──────────────────────────────────────────
-# Stores last seen state of files
+# Last seen state of files: path -> {"mtime", "size", "inode", "hash"}
 file_cache = {}
+# Directory mtimes from the last scan: path -> mtime
+dir_cache = {}
+cache_lock = threading.Lock()
+
+# Roots inotify could not watch — these fall back to rescans
+polled_folders = []
+file_watcher = None
+# Set once background_loop has handed the roots to the watcher.
+# Guarded by watch_lock together with file_watcher and polled_folders.
+watching_started = False
+watch_lock = threading.Lock()
 
 def get_project_name(filepath):
     for folder in WATCH_FOLDERS:
@@ -71,144 +325,518 @@ def get_project_name(filepath):
             return os.path.basename(folder)
     return "other"
 
-def scan_folders():
-    global file_cache
-    new_cache = {}
-    changes = []
+def skip_dir(name):
+    # Skip hidden and venv folders
+    return name.startswith(".") or name in SKIP_DIRS
 
-    for folder in WATCH_FOLDERS:
-        if not os.path.exists(folder):
-            continue
-        try:
-            for root, dirs, files in os.walk(folder):
-                # Skip hidden and venv folders
-                dirs[:] = [
-                    d for d in dirs
-                    if not d.startswith(".")
-                    and d not in ["venv", "node_modules", "__pycache__", ".git"]
-                ]
-                for filename in files:
-                    ext = os.path.splitext(filename)[1].lower()
-                    if ext not in TRACK_EXTENSIONS:
-                        continue
-                    filepath = os.path.join(root, filename)
-                    try:
-                        mtime = os.path.getmtime(filepath)
-                        size = os.path.getsize(filepath)
-                        new_cache[filepath] = {"mtime": mtime, "size": size}
-
-                        if filepath in file_cache:
-                            old = file_cache[filepath]
-                            if mtime > old["mtime"]:
-                                changes.append({
-                                    "filepath": filepath,
-                                    "filename": filename,
-                                    "project": get_project_name(filepath),
-                                    "action": "modified",
-                                    "size": size
-                                })
-                        else:
-                            # New file
-                            today = datetime.now().date()
-                            created_time = datetime.fromtimestamp(
-                                os.path.getctime(filepath)
-                            ).date()
-                            if created_time == today:
-                                changes.append({
-                                    "filepath": filepath,
-                                    "filename": filename,
-                                    "project": get_project_name(filepath),
-                                    "action": "created",
-                                    "size": size
-                                })
-                    except:
-                        pass
-        except:
-            pass
+def is_tracked(filepath):
+    return os.path.splitext(filepath)[1].lower() in TRACK_EXTENSIONS
+
+def load_watch_folders():
+    conn = connect()
+    rows = conn.execute("SELECT path FROM watch_folders ORDER BY added_ts").fetchall()
+    for (path,) in rows:
+        if path not in WATCH_FOLDERS:
+            WATCH_FOLDERS.append(path)
+
+def load_file_state():
+    conn = connect()
+    c = conn.cursor()
+    c.execute("SELECT filepath, mtime, size, inode, hash FROM file_state")
+    files = {
+        row[0]: {"mtime": row[1], "size": row[2], "inode": row[3], "hash": row[4]}
+        for row in c.fetchall()
+    }
+    c.execute("SELECT dirpath, mtime, subdirs, files FROM dir_state")
+    dirs = {}
+    for dirpath, mtime, subdirs, names in c.fetchall():
+        # Rows saved before listings were stored get None, so the
+        # next scan rewrites them with their file names
+        dirs[dirpath] = mtime if names is not None else None
+        if names is not None:
+            # Hand the saved listing to the shared scanner so an unchanged
+            # directory is not read again after a restart
+            scanner.seed_listing(
+                dirpath, mtime,
+                subdirs.split("\n") if subdirs else [],
+                names.split("\n") if names else []
+            )
+    with cache_lock:
+        file_cache.update(files)
+        dir_cache.update(dirs)
+
+def save_file_state(files, dirs=(), removed_files=(), removed_dirs=(), line_hashes=None):
+    with storage.transaction(DB_PATH) as conn:
+        conn.executemany("""
+            INSERT INTO file_state (filepath, mtime, size, inode, hash) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (filepath) DO UPDATE SET
+                mtime = excluded.mtime, size = excluded.size,
+                inode = excluded.inode, hash = excluded.hash
+        """, [(path, s["mtime"], s["size"], s["inode"], s.get("hash")) for path, s in files.items()])
+        # Only files whose content changed carry new line hashes
+        conn.executemany(
+            "UPDATE file_state SET line_hashes = ? WHERE filepath = ?",
+            [(lines, path) for path, lines in (line_hashes or {}).items()]
+        )
+        rows = []
+        for dirpath in dirs:
+            listing = scanner.cached_listing(dirpath)
+            if listing:
+                rows.append((
+                    dirpath, listing["mtime"],
+                    "\n".join(listing["dirs"]), "\n".join(listing["files"])
+                ))
+        conn.executemany(
+            "INSERT OR REPLACE INTO dir_state (dirpath, mtime, subdirs, files) VALUES (?, ?, ?, ?)",
+            rows
+        )
+        conn.executemany("DELETE FROM file_state WHERE filepath = ?", [(p,) for p in removed_files])
+        conn.executemany("DELETE FROM dir_state WHERE dirpath = ?", [(p,) for p in removed_dirs])
+
+def hash_bytes(data):
+    if xxhash:
+        return xxhash.xxh64_hexdigest(data)
+    return format(zlib.crc32(data), "08x")
+
+def fingerprint(filepath):
+    """
+    Returns (content_hash, line_hashes) for a file. line_hashes is a
+    packed array of per-line crc32s, None for binary files. Both are
+    None when the file is unreadable or larger than MAX_HASH_BYTES.
+    """
+    try:
+        if os.path.getsize(filepath) > MAX_HASH_BYTES:
+            return None, None
+        with open(filepath, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None, None
+    lines = None
+    if b"\0" not in data[:8192]:
+        lines = array("I", [zlib.crc32(line) for line in data.splitlines()]).tobytes()
+    return hash_bytes(data), lines
+
+def line_delta(old_lines, new_lines):
+    # Lines are compared as multisets, so moving a line counts as nothing
+    # and editing one counts as one added plus one removed
+    if old_lines is None or new_lines is None:
+        return None, None
+    old = array("I")
+    old.frombytes(old_lines)
+    new = array("I")
+    new.frombytes(new_lines)
+    old = Counter(old)
+    new = Counter(new)
+    return sum((new - old).values()), sum((old - new).values())
+
+def load_line_hashes(filepath):
+    conn = connect()
+    row = conn.execute(
+        "SELECT line_hashes FROM file_state WHERE filepath = ?", (filepath,)
+    ).fetchone()
+    return row[0] if row else None
+
+def content_change(filepath, old, state):
+    """
+    Called once a file's size, mtime or inode moved. Hashes it, stores
+    the hash in state and returns (changed, lines_added, lines_removed,
+    line_hashes). old is the previous state, None for a new file.
+    """
+    if not HASH_CONTENTS:
+        return True, None, None, None
+    digest, lines = fingerprint(filepath)
+    state["hash"] = digest
+    if digest is not None and old and old.get("hash") == digest:
+        return False, 0, 0, None
+    # A new file is all added lines. A file known from before hashing
+    # was enabled has nothing to diff against yet.
+    old_lines = load_line_hashes(filepath) if old else b""
+    added, removed = line_delta(old_lines, lines)
+    return True, added, removed, lines
+
+def fill_fingerprint(filepath, state, new_lines):
+    # Hashes a file the snapshot knows about without reporting it, so
+    # its first save can be told apart from a no-op and has a line delta
+    if HASH_CONTENTS:
+        state["hash"], new_lines[filepath] = fingerprint(filepath)
+
+def _root_of(path, folders):
+    for folder in folders:
+        if path == folder or path.startswith(folder + "/"):
+            return folder
+    return None
+
+def scan_folders(folders=None):
+    """
+    Rescans folders (all WATCH_FOLDERS by default) against the cached
+    state and returns the files that changed. Change timestamps are the
+    file mtimes, not the time of the scan. Folders with no saved state
+    yet are only snapshotted, nothing is reported for them.
+    """
+    folders = WATCH_FOLDERS if folders is None else folders
+    folders = [f for f in folders if os.path.exists(f)]
+    baseline = set(f for f in folders if f in dir_cache)
+
+    seen_files = {}
+    seen_dirs = {}
+    new_lines = {}
+    changes = []
 
-    file_cache = new_cache
+    for info in scanner.walk(folders, extensions=TRACK_EXTENSIONS, skip_dir=skip_dir):
+        seen_dirs[info.path] = info.mtime
+        has_baseline = _root_of(info.path, folders) in baseline
+
+        for f in info.files:
+            old = file_cache.get(f.path)
+            state = {
+                "mtime": f.mtime, "size": f.size, "inode": f.inode,
+                "hash": old.get("hash") if old else None
+            }
+            seen_files[f.path] = state
+
+            if old:
+                if not (f.mtime > old["mtime"] or f.size != old["size"]
+                        or f.inode != old.get("inode", f.inode)):
+                    if old.get("hash") is None:
+                        # Known from before hashing was enabled
+                        fill_fingerprint(f.path, state, new_lines)
+                    continue
+                action = "modified"
+                timestamp = f.mtime
+            elif has_baseline:
+                # New file under a folder we already knew
+                action = "created"
+                timestamp = f.ctime
+            else:
+                # Baseline snapshot: nothing to report yet
+                fill_fingerprint(f.path, state, new_lines)
+                continue
+
+            changed, added, removed, lines = content_change(f.path, old, state)
+            if not changed:
+                continue
+            new_lines[f.path] = lines
+            changes.append({
+                "filepath": f.path,
+                "filename": f.name,
+                "project": get_project_name(f.path),
+                "action": action,
+                "size": f.size,
+                "timestamp": timestamp,
+                "lines_added": added,
+                "lines_removed": removed
+            })
+
+    with cache_lock:
+        # Drop entries under the scanned folders that no longer exist
+        prefixes = tuple(folder + "/" for folder in folders)
+        removed_files = [
+            p for p in file_cache
+            if p not in seen_files and p.startswith(prefixes)
+        ]
+        removed_dirs = [
+            p for p in dir_cache
+            if p not in seen_dirs and (p in folders or p.startswith(prefixes))
+        ]
+        changed_files = {
+            p: s for p, s in seen_files.items() if file_cache.get(p) != s
+        }
+        changed_dirs = {
+            p: m for p, m in seen_dirs.items() if dir_cache.get(p) != m
+        }
+        for p in removed_files:
+            del file_cache[p]
+        for p in removed_dirs:
+            del dir_cache[p]
+        file_cache.update(changed_files)
+        dir_cache.update(changed_dirs)
+    save_file_state(changed_files, changed_dirs, removed_files, removed_dirs, new_lines)
     return changes
 
+def handle_file_events(events):
+    # Called by the inotify watcher with coalesced (path, action, timestamp)
+    changes = []
+    states = {}
+    new_lines = {}
+    for filepath, action, ts in events:
+        try:
+            st = os.stat(filepath)
+        except OSError:
+            # Temp file that was renamed or deleted before we got to it
+            continue
+        with cache_lock:
+            old = file_cache.get(filepath)
+        state = {
+            "mtime": st.st_mtime, "size": st.st_size, "inode": st.st_ino,
+            "hash": old.get("hash") if old else None
+        }
+        if old and state == old:
+            continue
+        changed, added, removed, lines = content_change(filepath, old, state)
+        with cache_lock:
+            file_cache[filepath] = state
+        states[filepath] = state
+        if not changed:
+            # Saved without changing anything
+            continue
+        new_lines[filepath] = lines
+        if action == "created" and old:
+            # Editors save by writing a temp file and renaming it over
+            action = "modified"
+        changes.append({
+            "filepath": filepath,
+            "filename": os.path.basename(filepath),
+            "project": get_project_name(filepath),
+            "action": action,
+            "size": st.st_size,
+            "timestamp": ts,
+            "lines_added": added,
+            "lines_removed": removed
+        })
+    save_file_state(states, line_hashes=new_lines)
+    save_changes(changes)
+
+def rescan_after_overflow():
+    # The kernel dropped events, so catch up with one full pass
+    global repos_scanned
+    repos_scanned = 0
+    threading.Thread(
+        target=lambda: save_changes(scan_folders()), daemon=True
+    ).start()
+
+def start_file_watcher():
+    """
+    Starts inotify on every watch folder. Folders it cannot cover
+    are returned and stay on the periodic rescan.
+    """
+    roots = [f for f in WATCH_FOLDERS if os.path.exists(f)]
+    try:
+        from plugins.fswatch import TreeWatcher
+        watcher = TreeWatcher(
+            handle_file_events,
+            skip_dir=skip_dir,
+            accept=is_tracked,
+            on_overflow=rescan_after_overflow,
+            debounce=DEBOUNCE_SECONDS,
+            on_dir_event=handle_dir_event
+        )
+    except Exception as e:
+        print("Changelog: inotify unavailable (" + str(e) + "), using periodic scans")
+        return None, roots
+    fallback = [root for root in roots if not watcher.add_tree(root)]
+    watcher.start()
+    return watcher, fallback
+
+# ── Git Repos ─────────────────────────────────────────────
+# Repos under the watch folders. The watcher's directory events keep
+# the set current; the whole tree is only walked again every
+# REPO_RESCAN_SECONDS as a safety net. Folders without inotify send
+# no events, so those are walked on every check.
+REPO_RESCAN_SECONDS = 3600
+repo_paths = set()
+repos_scanned = 0
+repos_lock = threading.Lock()
+
+def _find_repos(folders):
+    # Nested repos count too, not just the watch folders themselves
+    return set(
+        info.path for info in scanner.find_marked_dirs(folders, ".git", skip_dir=skip_dir)
+    )
+
+def _forget_repos(folders):
+    prefixes = tuple(folder + "/" for folder in folders)
+    for path in [p for p in repo_paths if p in folders or p.startswith(prefixes)]:
+        repo_paths.discard(path)
+
+def find_watched_repos():
+    global repos_scanned
+    now = time.time()
+    if now - repos_scanned >= REPO_RESCAN_SECONDS:
+        found = _find_repos(WATCH_FOLDERS)
+        with repos_lock:
+            repo_paths.clear()
+            repo_paths.update(found)
+        repos_scanned = now
+    elif polled_folders:
+        folders = list(polled_folders)
+        found = _find_repos(folders)
+        with repos_lock:
+            _forget_repos(folders)
+            repo_paths.update(found)
+    with repos_lock:
+        return sorted(repo_paths)
+
+def handle_dir_event(path, action):
+    # Called by the inotify watcher when a directory appears or goes away
+    name = os.path.basename(path)
+    if name == ".git":
+        with repos_lock:
+            if action == "created":
+                repo_paths.add(os.path.dirname(path))
+            else:
+                repo_paths.discard(os.path.dirname(path))
+        return
+    if action == "removed":
+        with repos_lock:
+            _forget_repos([path])
+    elif not skip_dir(name):
+        # A cloned or moved-in tree may already hold repos of its own
+        found = _find_repos([path])
+        with repos_lock:
+            repo_paths.update(found)
+
+def run_git_log(repo_path, args):
+    result = subprocess.run(
+        ["git", "log", "--format=%H%x1f%at%x1f%s", "--shortstat"] + args,
+        capture_output=True, text=True, cwd=repo_path, timeout=30
+    )
+    if result.returncode != 0:
+        return None
+    commits = []
+    for line in result.stdout.split("\n"):
+        if "\x1f" in line:
+            commit_hash, when, message = line.split("\x1f", 2)
+            commits.append({
+                "hash": commit_hash,
+                "timestamp": int(when),
+                "repo": os.path.basename(repo_path),
+                "message": message.strip(),
+                "files_changed": 0
+            })
+        elif "changed" in line and commits:
+            match = re.search(r"(\d+) files? changed", line)
+            if match:
+                commits[-1]["files_changed"] = int(match.group(1))
+    return commits
+
 def scan_git_commits():
+    """
+    Returns commits made since the last scan of each repo under the
+    watch folders. Repos seen for the first time contribute their
+    last 24 hours. The newest hash per repo is saved by save_commits.
+    """
+    conn = connect()
+    last_seen = dict(conn.execute("SELECT repo_path, last_hash FROM git_repos").fetchall())
+
     commits = []
-    for folder in WATCH_FOLDERS:
-        if not os.path.exists(folder):
-            continue
+    heads = {}
+    for repo_path in find_watched_repos():
         try:
-            result = subprocess.run(
-                'git log --since="24 hours ago" --oneline --format="%H|%s|%ai"',
-                shell=True, capture_output=True,
-                text=True, cwd=folder
-            )
-            if result.stdout.strip():
-                for line in result.stdout.strip().split("\n"):
-                    if "|" in line:
-                        parts = line.split("|")
-                        if len(parts) >= 2:
-                            commits.append({
-                                "repo": os.path.basename(folder),
-                                "message": parts[1].strip()
-                            })
-        except:
+            head = subprocess.run(
+                ["git", "rev-parse", "HEAD"],
+                capture_output=True, text=True, cwd=repo_path, timeout=10
+            ).stdout.strip()
+            if not head or head == last_seen.get(repo_path):
+                continue
+            new = None
+            if last_seen.get(repo_path):
+                new = run_git_log(repo_path, [last_seen[repo_path] + "..HEAD"])
+            if new is None:
+                # First visit, or history was rewritten under us
+                new = run_git_log(repo_path, ["--since=24 hours ago"])
+            commits.extend(new or [])
+            heads[repo_path] = head
+        except Exception:
             pass
-    return commits
+    return commits, heads
 
 def save_changes(changes):
     if not changes:
         return
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    for change in changes:
-        c.execute("""
+    with storage.transaction(DB_PATH) as conn:
+        conn.executemany("""
             INSERT INTO file_activity
-            (timestamp, filepath, filename, project, action, size_bytes)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (
-            datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            change["filepath"],
-            change["filename"],
-            change["project"],
-            change["action"],
-            change["size"]
-        ))
-    conn.commit()
-    conn.close()
-
-def save_commits(commits):
-    if not commits:
-        return
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    for commit in commits:
-        c.execute("""
-            INSERT INTO git_commits
-            (timestamp, repo, message, files_changed)
-            VALUES (?, ?, ?, ?)
-        """, (
-            datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            commit["repo"],
-            commit["message"],
-            0
-        ))
-    conn.commit()
-    conn.close()
+            (ts, filepath, filename, project, action, size_bytes, lines_added, lines_removed)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, [
+            (
+                int(change.get("timestamp") or time.time()),
+                change["filepath"],
+                change["filename"],
+                change["project"],
+                change["action"],
+                change["size"],
+                change.get("lines_added"),
+                change.get("lines_removed")
+            )
+            for change in changes
+        ])
+        conn.executemany("""
+            INSERT INTO file_activity_daily
+            (day, project, filename, action, edits, lines_added, lines_removed)
+            VALUES (?, ?, ?, ?, 1, ?, ?)
+            ON CONFLICT (day, project, filename, action)
+            DO UPDATE SET edits = edits + 1,
+                          lines_added = lines_added + excluded.lines_added,
+                          lines_removed = lines_removed + excluded.lines_removed
+        """, [
+            (
+                datetime.fromtimestamp(change.get("timestamp") or time.time()).strftime("%Y-%m-%d"),
+                change["project"],
+                change["filename"],
+                change["action"],
+                change.get("lines_added") or 0,
+                change.get("lines_removed") or 0
+            )
+            for change in changes
+        ])
+
+def save_commits(commits, heads=None):
+    with storage.transaction(DB_PATH) as conn:
+        conn.executemany("""
+            INSERT OR IGNORE INTO git_commits
+            (ts, repo, message, files_changed, hash)
+            VALUES (?, ?, ?, ?, ?)
+        """, [
+            (
+                commit["timestamp"],
+                commit["repo"],
+                commit["message"],
+                commit["files_changed"],
+                commit["hash"]
+            )
+            for commit in commits
+        ])
+        conn.executemany(
+            "INSERT OR REPLACE INTO git_repos (repo_path, last_hash) VALUES (?, ?)",
+            list((heads or {}).items())
+        )
 
 # ── Background Scanner ────────────────────────────────────
 def background_loop():
+    global polled_folders, file_watcher, watching_started
     init_db()
-    # Initial scan to build cache without recording changes
-    scan_folders()
-    print("Changelog: watching your project folders")
+    load_watch_folders()
+    # Diff against the state saved before the last shutdown, so edits
+    # made while the bot was down still make it into the changelog.
+    # On the very first run this only builds the snapshot.
+    load_file_state()
+    try:
+        save_changes(scan_folders())
+    except Exception as e:
+        print("Changelog startup scan error: " + str(e))
+    with watch_lock:
+        file_watcher, polled_folders = start_file_watcher()
+        watching_started = True
+    if file_watcher:
+        print("Changelog: watching your project folders (inotify)")
+    else:
+        print("Changelog: watching your project folders")
 
+    last_retention = 0
     while True:
         time.sleep(120)  # Check every 2 minutes
         try:
-            changes = scan_folders()
-            if changes:
-                save_changes(changes)
-            commits = scan_git_commits()
-            if commits:
-                save_commits(commits)
+            if time.time() - last_retention > 86400:
+                apply_retention()
+                last_retention = time.time()
+            if polled_folders:
+                changes = scan_folders(list(polled_folders))
+                if changes:
+                    save_changes(changes)
+            commits, heads = scan_git_commits()
+            if heads:
+                save_commits(commits, heads)
         except Exception as e:
             print("Changelog scan error: " + str(e))
 
@@ -218,61 +846,80 @@ changelog_thread.start()
 # ── Report Generator ──────────────────────────────────────
 def generate_report(days=1):
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = connect()
         c = conn.cursor()
 
-        since = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+        # Whole calendar days: 1 = today, 2 = yesterday and today, ...
+        start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        start -= timedelta(days=days - 1)
+        since = int(start.timestamp())
 
-        # Get file activity
+        # Per-project totals from the project rollup, one row per day
+        first_day = start.strftime("%Y-%m-%d")
         c.execute("""
-            SELECT project, filename, action, COUNT(*) as edits
-            FROM file_activity
-            WHERE timestamp > ?
-            GROUP BY project, filename, action
-            ORDER BY project, edits DESC
-        """, (since,))
-        file_rows = c.fetchall()
+            SELECT project, SUM(files), SUM(lines_added), SUM(lines_removed)
+            FROM project_activity_daily
+            WHERE day >= ?
+            GROUP BY project
+            ORDER BY project
+        """, (first_day,))
+        project_rows = c.fetchall()
 
         # Get git commits
         c.execute("""
             SELECT repo, message
             FROM git_commits
-            WHERE timestamp > ?
-            ORDER BY timestamp DESC
+            WHERE ts > ?
+            ORDER BY ts DESC
         """, (since,))
         commit_rows = c.fetchall()
 
-        conn.close()
-
-        if not file_rows and not commit_rows:
+        if not project_rows and not commit_rows:
             return "No activity recorded yet. Give it a few minutes to start tracking."
 
+        def recent_files(project, action):
+            # Newest days first, busiest files first within a day. The
+            # index walks the days in order, so it stops after LIMIT rows.
+            c.execute("""
+                SELECT filename FROM file_activity_daily
+                WHERE project = ? AND action = ? AND day >= ?
+                ORDER BY day DESC, edits DESC
+                LIMIT 50
+            """, (project, action, first_day))
+            names = []
+            for (filename,) in c.fetchall():
+                if filename not in names:
+                    names.append(filename)
+            return names[:5]
+
         # Build report
         today = datetime.now().strftime("%B %d, %Y")
         report = "*Personal Changelog - " + today + "*\n\n"
 
-        if file_rows:
-            # Group by project
-            projects = {}
-            for row in file_rows:
-                project, filename, action, edits = row
-                if project not in projects:
-                    projects[project] = {"modified": [], "created": []}
-                if action == "modified" and filename not in projects[project]["modified"]:
-                    projects[project]["modified"].append(filename)
-                elif action == "created" and filename not in projects[project]["created"]:
-                    projects[project]["created"].append(filename)
-
+        if project_rows:
             report += "*Files worked on:*\n"
-            for project, data in sorted(projects.items()):
+            for project, files, added, removed in project_rows:
                 report += "\n" + project + "/\n"
-                if data["created"]:
-                    report += "  Created: " + ", ".join(data["created"][:5]) + "\n"
-                if data["modified"]:
-                    report += "  Modified: " + ", ".join(data["modified"][:5]) + "\n"
-
-            total_files = len(set([r[1] for r in file_rows]))
-            report += "\nTotal files touched: " + str(total_files) + "\n"
+                created = recent_files(project, "created")
+                modified = recent_files(project, "modified")
+                if created:
+                    report += "  Created: " + ", ".join(created) + "\n"
+                if modified:
+                    report += "  Modified: " + ", ".join(modified) + "\n"
+                if added or removed:
+                    report += "  Lines: +" + str(added) + " -" + str(removed) + "\n"
+
+            # files is distinct per day, so over several days a file
+            # worked on each day counts once for every one of them
+            total_files = sum(r[1] for r in project_rows)
+            if days == 1:
+                report += "\nTotal files touched: " + str(total_files) + "\n"
+            else:
+                report += "\nFiles touched (counted once per day): " + str(total_files) + "\n"
+            total_added = sum(r[2] for r in project_rows)
+            total_removed = sum(r[3] for r in project_rows)
+            if total_added or total_removed:
+                report += "Lines changed: +" + str(total_added) + " -" + str(total_removed) + "\n"
 
         if commit_rows:
             report += "\n*Git commits:*\n"
@@ -288,16 +935,44 @@ def generate_report(days=1):
     except Exception as e:
         return "Changelog error: " + str(e)
 
+def baseline_watch_folder(path):
+    """
+    Hooks a newly added folder into the running watcher, then takes its
+    baseline snapshot. Watching starts first so nothing saved during the
+    snapshot is lost; files already in the folder are not reported.
+    """
+    with watch_lock:
+        # Before background_loop starts watching, it picks the
+        # folder up from WATCH_FOLDERS on its own
+        if watching_started and not (file_watcher and file_watcher.add_tree(path)):
+            polled_folders.append(path)
+    try:
+        scan_folders([path])
+        found = _find_repos([path])
+        with repos_lock:
+            repo_paths.update(found)
+    except Exception as e:
+        print("Changelog baseline error: " + str(e))
+
 def add_watch_folder(folder_path):
     global WATCH_FOLDERS
-    path = os.path.expanduser(folder_path)
-    if os.path.exists(path) and path not in WATCH_FOLDERS:
-        WATCH_FOLDERS.append(path)
-        return "Now watching: " + path
-    elif not os.path.exists(path):
+    path = os.path.abspath(os.path.expanduser(folder_path))
+    if not os.path.exists(path):
         return "Folder not found: " + folder_path
-    else:
+    parent = _root_of(path, WATCH_FOLDERS)
+    if parent == path:
         return "Already watching: " + path
+    if parent:
+        return "Already watching: " + path + " (inside " + parent + ")"
+
+    with storage.transaction(DB_PATH) as conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO watch_folders (path, added_ts) VALUES (?, ?)",
+            (path, int(time.time()))
+        )
+    WATCH_FOLDERS.append(path)
+    threading.Thread(target=baseline_watch_folder, args=(path,), daemon=True).start()
+    return "Now watching: " + path + "\nTaking a snapshot in the background, new edits show up from now on."
 
 # ── Plugin Class ──────────────────────────────────────────
 class ChangelogPlugin(Plugin):
@@ -1,15 +1,13 @@
 # plugins/context_switcher.py
 import os
-import sqlite3
 import subprocess
 from datetime import datetime
 from plugins.base import Plugin
+from plugins import storage
 
-DB_PATH = os.path.expanduser("~/myclaw/context_switcher.db")
+DB_PATH = storage.db_path("context_switcher.db")
 
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+def create_tables(c):
     c.execute("""
         CREATE TABLE IF NOT EXISTS contexts (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -23,8 +21,9 @@ def init_db():
             active INTEGER DEFAULT 0
         )
     """)
-    conn.commit()
-    conn.close()
+
+def init_db():
+    storage.migrate(DB_PATH, [create_tables])
 
 init_db()
 
@@ -91,12 +90,15 @@ def get_git_context():
 def detect_current_project():
     try:
         home = os.path.expanduser("~")
+        # Repos directly under home, most recently touched first. One
+        # level only, so stat <child>/.git instead of reading every child.
         projects = []
-        for name in os.listdir(home):
-            path = os.path.join(home, name)
-            if os.path.isdir(path) and os.path.exists(os.path.join(path, ".git")):
-                mtime = os.path.getmtime(path)
-                projects.append((name, mtime, path))
+        with os.scandir(home) as entries:
+            for entry in entries:
+                if entry.name.startswith(".") or not entry.is_dir():
+                    continue
+                if os.path.exists(os.path.join(entry.path, ".git")):
+                    projects.append((entry.name, entry.stat().st_mtime, entry.path))
         if projects:
             projects.sort(key=lambda x: x[1], reverse=True)
             return projects[0][0], projects[0][2]
@@ -120,16 +122,13 @@ def save_context(project_name=None, notes=""):
         if notes:
             summary_parts.append(notes)
         summary = " | ".join(summary_parts) if summary_parts else "general work session"
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("UPDATE contexts SET active = 0")
-        c.execute("""
-            INSERT INTO contexts
-            (timestamp, project, summary, open_files, last_commands, git_status, notes, active)
-            VALUES (?, ?, ?, ?, ?, ?, ?, 1)
-        """, (timestamp, project_name, summary, open_files, last_commands, git_status, notes))
-        conn.commit()
-        conn.close()
+        with storage.transaction(DB_PATH) as conn:
+            conn.execute("UPDATE contexts SET active = 0")
+            conn.execute("""
+                INSERT INTO contexts
+                (timestamp, project, summary, open_files, last_commands, git_status, notes, active)
+                VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+            """, (timestamp, project_name, summary, open_files, last_commands, git_status, notes))
         return (
             "Context saved for " + project_name + "\n\n"
             "Snapshot:\n"
@@ -143,20 +142,16 @@ def save_context(project_name=None, notes=""):
 
 def load_context(project_name=None):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
         if project_name:
-            c.execute("""
+            row = storage.query_one(DB_PATH, """
                 SELECT timestamp, project, summary, open_files, last_commands, git_status, notes
                 FROM contexts WHERE project LIKE ? ORDER BY timestamp DESC LIMIT 1
             """, ("%" + project_name + "%",))
         else:
-            c.execute("""
+            row = storage.query_one(DB_PATH, """
                 SELECT timestamp, project, summary, open_files, last_commands, git_status, notes
                 FROM contexts ORDER BY timestamp DESC LIMIT 1
             """)
-        row = c.fetchone()
-        conn.close()
         if not row:
             return "No saved context found. Say save context first."
         timestamp, project, summary, open_files, last_commands, git_status, notes = row
@@ -181,11 +176,7 @@ def load_context(project_name=None):
 
 def list_contexts():
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("SELECT timestamp, project, summary FROM contexts ORDER BY timestamp DESC LIMIT 10")
-        rows = c.fetchall()
-        conn.close()
+        rows = storage.query(DB_PATH, "SELECT timestamp, project, summary FROM contexts ORDER BY timestamp DESC LIMIT 10")
         if not rows:
             return "No contexts saved yet."
         result = "*Saved Contexts:*\n\n"
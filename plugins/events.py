@@ -0,0 +1,193 @@
+# plugins/events.py
+# Time-series event store for events no plugin table keeps
+# API failures and anomaly alerts are appended here as (ts, kind, key,
+# value, payload) rows. Everything else stays in its plugin's own
+# tables, and cross-plugin questions — "what was running when Groq
+# failed" — join these timestamps against them. Rows go into one table
+# per calendar month (UTC), so retention trims or drops whole partitions.
+
+import json
+import time
+import threading
+from datetime import datetime, timezone
+from plugins import storage
+
+DB_PATH = storage.db_path("events.db")
+
+# kind -> (raw_days, keep_days). Raw rows older than raw_days are
+# downsampled into hourly buckets (count, sum, min, max per key),
+# and buckets older than keep_days are deleted. None means forever.
+RETENTION = {
+    "api_error": (90, None),
+    "alert":     (90, None),
+}
+DEFAULT_RETENTION = (30, 365)
+
+PARTITION_PREFIX = "events_"
+
+_partitions = set()
+_partition_lock = threading.Lock()
+
+# ── Schema ────────────────────────────────────────────────
+def create_tables(c):
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS events_hourly (
+            bucket INTEGER,
+            kind TEXT,
+            key TEXT,
+            count INTEGER,
+            sum REAL,
+            min REAL,
+            max REAL,
+            PRIMARY KEY (bucket, kind, key)
+        )
+    """)
+
+def init_db():
+    storage.migrate(DB_PATH, [create_tables])
+
+def partition_for(ts):
+    return PARTITION_PREFIX + datetime.fromtimestamp(ts, timezone.utc).strftime("%Y%m")
+
+def partition_range(name):
+    """(start_ts, end_ts) covered by a partition table."""
+    start = datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m").replace(tzinfo=timezone.utc)
+    if start.month == 12:
+        end = start.replace(year=start.year + 1, month=1)
+    else:
+        end = start.replace(month=start.month + 1)
+    return int(start.timestamp()), int(end.timestamp())
+
+def ensure_partition(name):
+    if name in _partitions:
+        return
+    with _partition_lock:
+        if name in _partitions:
+            return
+        conn = storage.connect(DB_PATH)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS " + name + " ("
+            "ts INTEGER NOT NULL, kind TEXT NOT NULL, key TEXT, value REAL, payload TEXT)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS " + name + "_ts ON " + name + " (ts)")
+        conn.execute("CREATE INDEX IF NOT EXISTS " + name + "_kind_ts ON " + name + " (kind, ts)")
+        _partitions.add(name)
+
+def list_partitions():
+    rows = storage.query(
+        DB_PATH,
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB 'events_[0-9]*' ORDER BY name"
+    )
+    return [row[0] for row in rows]
+
+# ── Writing ───────────────────────────────────────────────
+def _payload(payload):
+    if payload is None or isinstance(payload, str):
+        return payload
+    return json.dumps(payload)
+
+def record(kind, key, value=None, payload=None, ts=None):
+    """Queues one event. payload may be a string or anything JSON can encode."""
+    record_many([(kind, key, value, payload, ts)])
+
+def record_many(rows):
+    """rows: (kind, key, value, payload, ts) tuples, ts None meaning now."""
+    now = int(time.time())
+    writes = storage.writer(DB_PATH)
+    for kind, key, value, payload, ts in rows:
+        ts = int(ts) if ts else now
+        name = partition_for(ts)
+        try:
+            ensure_partition(name)
+            writes.put(
+                "INSERT INTO " + name + " (ts, kind, key, value, payload) VALUES (?, ?, ?, ?, ?)",
+                (ts, kind, key, value, _payload(payload))
+            )
+        except Exception as e:
+            print("Event store error: " + str(e))
+
+# ── Querying ──────────────────────────────────────────────
+def query(kind, since, key=None):
+    """
+    Every `kind` event since `since` across the partitions involved,
+    oldest first, as (ts, key, value, payload) tuples.
+    """
+    storage.writer(DB_PATH).flush()
+    parts = []
+    params = []
+    for name in list_partitions():
+        start, end = partition_range(name)
+        if end <= since:
+            continue
+        sql = "SELECT ts, key, value, payload FROM " + name + " WHERE kind = ? AND ts >= ?"
+        params.extend([kind, since])
+        if key is not None:
+            sql += " AND key = ?"
+            params.append(key)
+        parts.append(sql)
+    if not parts:
+        return []
+    return storage.query(DB_PATH, " UNION ALL ".join(parts) + " ORDER BY 1", params)
+
+# ── Retention ─────────────────────────────────────────────
+def apply_retention(now=None):
+    """
+    Folds raw events past their kind's raw_days into events_hourly,
+    deletes them, drops partitions left empty and trims old buckets.
+    Returns (rows_downsampled, partitions_dropped).
+    """
+    now = int(now or time.time())
+    storage.writer(DB_PATH).flush()
+    downsampled = 0
+    dropped = 0
+    for name in list_partitions():
+        start, end = partition_range(name)
+        kinds = [row[0] for row in storage.query(DB_PATH, "SELECT DISTINCT kind FROM " + name)]
+        expired_all = end <= now
+        with storage.transaction(DB_PATH) as conn:
+            for kind in kinds:
+                raw_days = RETENTION.get(kind, DEFAULT_RETENTION)[0]
+                if raw_days is None:
+                    expired_all = False
+                    continue
+                cutoff = now - raw_days * 86400
+                if cutoff <= start:
+                    expired_all = False
+                    continue
+                if cutoff < end:
+                    expired_all = False
+                conn.execute("""
+                    INSERT INTO events_hourly (bucket, kind, key, count, sum, min, max)
+                    SELECT ts / 3600 * 3600, kind, COALESCE(key, ''), COUNT(*),
+                           COALESCE(SUM(value), 0), MIN(value), MAX(value)
+                    FROM """ + name + """
+                    WHERE kind = ? AND ts < ?
+                    GROUP BY 1, kind, 3
+                    ON CONFLICT (bucket, kind, key) DO UPDATE SET
+                        count = count + excluded.count,
+                        sum = sum + excluded.sum,
+                        min = MIN(COALESCE(min, excluded.min), COALESCE(excluded.min, min)),
+                        max = MAX(COALESCE(max, excluded.max), COALESCE(excluded.max, max))
+                """, (kind, cutoff))
+                downsampled += conn.execute(
+                    "DELETE FROM " + name + " WHERE kind = ? AND ts < ?", (kind, cutoff)
+                ).rowcount
+            if expired_all:
+                # Every row was folded away, the month is done
+                conn.execute("DROP TABLE " + name)
+                with _partition_lock:
+                    _partitions.discard(name)
+                dropped += 1
+    kinds = [row[0] for row in storage.query(DB_PATH, "SELECT DISTINCT kind FROM events_hourly")]
+    with storage.transaction(DB_PATH) as conn:
+        for kind in kinds:
+            keep_days = RETENTION.get(kind, DEFAULT_RETENTION)[1]
+            if keep_days is not None:
+                conn.execute(
+                    "DELETE FROM events_hourly WHERE kind = ? AND bucket < ?",
+                    (kind, now - keep_days * 86400)
+                )
+    storage.connect(DB_PATH).execute("PRAGMA optimize")
+    return downsampled, dropped
+
+init_db()
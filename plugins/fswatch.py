@@ -0,0 +1,210 @@
+# plugins/fswatch.py
+# Tiny inotify wrapper used by the changelog watcher
+# Talks to libc through ctypes, so no extra dependency.
+# Events are coalesced per file and only handed over once
+# the file has been quiet for `debounce` seconds.
+
+import os
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = (
+    IN_CLOSE_WRITE | IN_CREATE | IN_MOVED_TO | IN_DELETE | IN_MOVED_FROM |
+    IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+)
+
+# struct inotify_event { int wd; uint32 mask; uint32 cookie; uint32 len; char name[]; }
+EVENT_HEADER = struct.Struct("iIII")
+
+class InotifyUnavailable(Exception):
+    pass
+
+def _load_libc():
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        return libc
+    except (OSError, AttributeError) as e:
+        raise InotifyUnavailable(str(e))
+
+class TreeWatcher:
+    """
+    Watches whole directory trees with inotify.
+
+    on_changes(events) is called from the watcher thread with a list of
+    (path, action, timestamp) where action is "created" or "modified" and
+    timestamp is when the last event for that path arrived.
+    skip_dir(name) returns True for directory names that should not be watched.
+    accept(path) returns True for files worth reporting.
+    on_overflow() is called if the kernel queue overflowed and events were lost.
+    on_dir_event(path, action) is called right away, without debouncing,
+    when a directory is "created" or "removed" inside a watched one —
+    including skipped names like ".git", which are never watched themselves.
+    """
+
+    def __init__(self, on_changes, skip_dir=None, accept=None,
+                 on_overflow=None, debounce=2.0, on_dir_event=None):
+        self.libc = _load_libc()
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise InotifyUnavailable(os.strerror(ctypes.get_errno()))
+        self.on_changes = on_changes
+        self.skip_dir = skip_dir or (lambda name: False)
+        self.accept = accept or (lambda path: True)
+        self.on_overflow = on_overflow
+        self.on_dir_event = on_dir_event
+        self.debounce = debounce
+        self.wd_paths = {}
+        self.path_wds = {}
+        # path -> [action, last_event_time]
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    # ── Watches ───────────────────────────────────────────
+    def _add_watch(self, path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            return ctypes.get_errno()
+        with self.lock:
+            self.wd_paths[wd] = path
+            self.path_wds[path] = wd
+        return 0
+
+    def add_tree(self, root):
+        """
+        Watches root and every directory below it.
+        Returns False if root itself cannot be watched (no inotify support
+        on that filesystem, or the user watch limit is exhausted).
+        """
+        err = self._add_watch(root)
+        if err:
+            print("Inotify: cannot watch " + root + " (" + os.strerror(err) + ")")
+            return False
+        for dirpath, dirs, files in os.walk(root):
+            dirs[:] = [d for d in dirs if not self.skip_dir(d)]
+            for d in dirs:
+                err = self._add_watch(os.path.join(dirpath, d))
+                if err == errno.ENOSPC:
+                    print("Inotify: watch limit reached, raise fs.inotify.max_user_watches")
+                    return False
+        return True
+
+    def _added_directory(self, path):
+        # Files can land in a new directory before its watch exists,
+        # so anything already inside is reported as created
+        if not self.add_tree(path):
+            return
+        now = time.time()
+        for dirpath, dirs, files in os.walk(path):
+            dirs[:] = [d for d in dirs if not self.skip_dir(d)]
+            for name in files:
+                self._queue(os.path.join(dirpath, name), "created", now)
+
+    def _forget(self, wd):
+        with self.lock:
+            path = self.wd_paths.pop(wd, None)
+            if path is not None:
+                self.path_wds.pop(path, None)
+
+    # ── Events ────────────────────────────────────────────
+    def _queue(self, path, action, ts):
+        if not self.accept(path):
+            return
+        with self.lock:
+            current = self.pending.get(path)
+            if current and current[0] == "created":
+                action = "created"
+            self.pending[path] = [action, ts]
+
+    def _read_events(self):
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        now = time.time()
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                if self.on_overflow:
+                    self.on_overflow()
+                continue
+            if mask & (IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF):
+                self._forget(wd)
+                continue
+
+            parent = self.wd_paths.get(wd)
+            if parent is None or not name:
+                continue
+            path = os.path.join(parent, os.fsdecode(name))
+
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    if not self.skip_dir(os.path.basename(path)):
+                        self._added_directory(path)
+                    self._dir_event(path, "created")
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._dir_event(path, "removed")
+                continue
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                self._queue(path, "created", now)
+            elif mask & IN_CLOSE_WRITE:
+                self._queue(path, "modified", now)
+
+    def _dir_event(self, path, action):
+        if self.on_dir_event:
+            try:
+                self.on_dir_event(path, action)
+            except Exception as e:
+                print("Inotify directory handler error: " + str(e))
+
+    def _flush(self):
+        cutoff = time.time() - self.debounce
+        with self.lock:
+            ready = [
+                (path, action, ts) for path, (action, ts) in self.pending.items()
+                if ts <= cutoff
+            ]
+            for path, _, _ in ready:
+                del self.pending[path]
+        if ready:
+            try:
+                self.on_changes(ready)
+            except Exception as e:
+                print("Inotify handler error: " + str(e))
+
+    def run(self):
+        while True:
+            readable, _, _ = select.select([self.fd], [], [], self.debounce / 2)
+            if readable:
+                self._read_events()
+            self._flush()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
@@ -6,6 +6,7 @@ import os
 import subprocess
 from datetime import datetime
 from plugins.base import Plugin
+from plugins import scanner
 
 # Your actual repo locations
 SEARCH_PATHS = [
@@ -19,35 +20,22 @@ IGNORE_REPOS = [
     ".nvm", ".cargo", ".rustup", ".local"
 ]
 
+def skip_repo_search(name):
+    return name in [".git", "node_modules", "venv", "__pycache__"] or name in IGNORE_REPOS
+
 def find_git_repos():
     repos = []
-    seen = set()
-    for search_path in SEARCH_PATHS:
-        if not os.path.exists(search_path):
+    home = os.path.expanduser("~")
+    # A .git at depth MAX_DEPTH means the repo itself is one level up
+    for info in scanner.find_marked_dirs(
+        SEARCH_PATHS, ".git", max_depth=MAX_DEPTH - 1, skip_dir=skip_repo_search
+    ):
+        repo_path = info.path
+        if repo_path == home:
             continue
-        try:
-            result = subprocess.run(
-                "find " + search_path + " -name .git -maxdepth " + str(MAX_DEPTH) + " -type d 2>/dev/null",
-                shell=True, capture_output=True, text=True
-            )
-            for line in result.stdout.strip().split("\n"):
-                if not line:
-                    continue
-                repo_path = line.replace("/.git", "")
-                skip = False
-                for ignore in IGNORE_REPOS:
-                    if ignore in repo_path:
-                        skip = True
-                        break
-                if skip:
-                    continue
-                if repo_path == os.path.expanduser("~"):
-                    continue
-                if repo_path not in seen:
-                    seen.add(repo_path)
-                    repos.append(repo_path)
-        except:
-            pass
+        if any(ignore in repo_path for ignore in IGNORE_REPOS):
+            continue
+        repos.append(repo_path)
     return repos
 
 def run_git(command, cwd):
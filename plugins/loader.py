@@ -28,9 +28,10 @@ def load_plugins() -> list:
         try:
             # Import the plugin module
             module = importlib.import_module(f"plugins.{module_name}")
-# Find all Plugin subclasses in the module
+            # Find all Plugin subclasses defined in the module. Helper modules
+            # (storage, scanner, ...) define none, so they load nothing.
             for name, obj in inspect.getmembers(module, inspect.isclass):
-                if issubclass(obj, Plugin) and obj is not Plugin:
+                if issubclass(obj, Plugin) and obj is not Plugin and obj.__module__ == module.__name__:
                     instance = obj()
                     plugins.append(instance)
                     print(f"🔌 Loaded plugin: {instance.name}")
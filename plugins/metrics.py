@@ -0,0 +1,116 @@
+# plugins/metrics.py
+# Fixed-size in-memory ring buffer for high-resolution samples
+# Backed by array("d"), so thousands of samples cost a few KB and
+# no numpy is needed. Old samples are overwritten in place; tiers
+# (1 minute, 15 minutes) are summarised out of it before anything
+# is written to disk. RollingWindow keeps a running average and peak
+# over a time window for readers that need them instantly.
+
+import math
+from array import array
+from collections import deque
+
+class MetricRing:
+    """
+    Holds the last `size` samples of a fixed set of metrics.
+    Every sample has one timestamp and one value per metric name;
+    missing values are stored as NaN and ignored when summarising.
+    """
+
+    def __init__(self, names, size):
+        self.names = list(names)
+        self.size = size
+        self.ts = array("d", [0.0] * size)
+        self.values = {name: array("d", [math.nan] * size) for name in self.names}
+        self.count = 0
+        self.next = 0
+
+    def append(self, ts, values):
+        i = self.next
+        self.ts[i] = ts
+        for name in self.names:
+            value = values.get(name)
+            self.values[name][i] = math.nan if value is None else value
+        self.next = (i + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def _indexes(self):
+        # Oldest first
+        start = (self.next - self.count) % self.size
+        return [(start + k) % self.size for k in range(self.count)]
+
+    def window(self, start, end):
+        """{name: [values]} for samples with start <= ts < end."""
+        picked = [i for i in self._indexes() if start <= self.ts[i] < end]
+        return {
+            name: [v for v in (self.values[name][i] for i in picked) if not math.isnan(v)]
+            for name in self.names
+        }
+
+    def latest(self):
+        if not self.count:
+            return None
+        i = (self.next - 1) % self.size
+        return {name: self.values[name][i] for name in self.names}
+
+def percentile(sorted_values, pct):
+    # Nearest-rank percentile
+    if not sorted_values:
+        return None
+    rank = max(1, int(math.ceil(pct / 100.0 * len(sorted_values))))
+    return sorted_values[rank - 1]
+
+def summarize(values):
+    """(min, max, avg, p95, samples) or None if there are no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return (
+        ordered[0],
+        ordered[-1],
+        round(sum(ordered) / len(ordered), 2),
+        percentile(ordered, 95),
+        len(ordered),
+    )
+
+class RollingWindow:
+    """
+    Running average and peak of the values added in the last `seconds`.
+    Adding is amortised O(1) and reading is O(1): a running sum gives the
+    average, and a deque of decreasing values keeps the peak at its front.
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.items = deque()
+        self.maxima = deque()
+        self.total = 0.0
+
+    def add(self, ts, value):
+        if value is None:
+            return
+        self.items.append((ts, value))
+        self.total += value
+        while self.maxima and self.maxima[-1][1] <= value:
+            self.maxima.pop()
+        self.maxima.append((ts, value))
+        self.expire(ts)
+
+    def expire(self, now):
+        cutoff = now - self.seconds
+        while self.items and self.items[0][0] < cutoff:
+            self.total -= self.items.popleft()[1]
+        while self.maxima and self.maxima[0][0] < cutoff:
+            self.maxima.popleft()
+        if not self.items:
+            # Start again from zero instead of carrying float drift
+            self.total = 0.0
+
+    def __len__(self):
+        return len(self.items)
+
+    def average(self):
+        return round(self.total / len(self.items), 1) if self.items else None
+
+    def peak(self):
+        return round(self.maxima[0][1], 1) if self.maxima else None
@@ -6,6 +6,7 @@ import os
 import shutil
 from datetime import datetime
 from plugins.base import Plugin
+from plugins import scanner
 
 # File type categories
 CATEGORIES = {
@@ -91,10 +92,7 @@ class OrganizerPlugin(Plugin):
                 return f"That is not a folder: {folder_path}", None
 
             # Scan all files
-            all_files = [
-                f for f in os.listdir(folder_path)
-                if os.path.isfile(os.path.join(folder_path, f))
-            ]
+            all_files = [f.name for f in scanner.list_files(folder_path)]
 
             if not all_files:
                 return f"No files found in {folder_path}", None
@@ -0,0 +1,477 @@
+# plugins/procfs.py
+# Direct /proc readers for the system monitors
+# Nothing here sleeps: CPU usage is the difference between two
+# readings, so a Sampler keeps the previous CPU counters for the
+# machine and for every process and reports usage since its last
+# sample, however long ago that was.
+
+import os
+import time
+import socket
+import struct
+
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+def read_cpu_times():
+    """(busy_ticks, total_ticks) summed over all CPUs since boot."""
+    with open("/proc/stat") as f:
+        fields = [int(x) for x in f.readline().split()[1:]]
+    # user nice system idle iowait irq softirq steal (guest is already in user)
+    total = sum(fields[:8])
+    idle = fields[3] + fields[4]
+    return total - idle, total
+
+def boot_time():
+    """Epoch seconds the machine booted at (btime in /proc/stat)."""
+    with open("/proc/stat") as f:
+        for line in f:
+            if line.startswith("btime "):
+                return int(line.split()[1])
+    return 0
+
+def read_meminfo():
+    """/proc/meminfo as {name: bytes}."""
+    info = {}
+    with open("/proc/meminfo") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            parts = rest.split()
+            if parts:
+                value = int(parts[0])
+                info[name] = value * 1024 if len(parts) > 1 else value
+    return info
+
+def disk_percent(path="/"):
+    st = os.statvfs(path)
+    total = st.f_blocks * st.f_frsize
+    used = (st.f_blocks - st.f_bfree) * st.f_frsize
+    # Same as df: reserved blocks count as unavailable
+    usable = used + st.f_bavail * st.f_frsize
+    return round(used / usable * 100, 1) if usable else 0.0
+
+def read_pid_stat(pid):
+    """
+    (name, cpu_ticks, start_time, rss_bytes) from /proc/[pid]/stat,
+    or None if the process is gone.
+    """
+    try:
+        with open("/proc/" + pid + "/stat", "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    # The name is in parentheses and may itself contain spaces or ")"
+    open_paren = data.find(b"(")
+    close_paren = data.rfind(b")")
+    name = data[open_paren + 1:close_paren].decode("utf-8", "replace")
+    fields = data[close_paren + 2:].split()
+    # fields[0] is field 3 (state) in proc(5)
+    utime = int(fields[11])
+    stime = int(fields[12])
+    start_time = int(fields[19])
+    rss = int(fields[21]) * PAGE_SIZE
+    return name, utime + stime, start_time, rss
+
+def list_pids():
+    return [entry.name for entry in os.scandir("/proc") if entry.name.isdigit()]
+
+class Sampler:
+    """
+    Keeps CPU counters between calls to sample().
+
+    Processes are keyed by (pid, start_time), so a recycled PID is seen
+    as a new process instead of inheriting the old one's counters. A
+    process seen for the first time reports 0% until the next sample.
+    With processes=False only the machine totals are read, which is
+    cheap enough to run every few seconds.
+    """
+
+    def __init__(self, processes=True):
+        self.track_processes = processes
+        self.prev_cpu = None
+        self.prev_time = None
+        # (pid, start_time) -> cpu_ticks
+        self.prev_procs = {}
+
+    def sample(self):
+        """
+        Returns {"ts", "cpu_percent", "ram_percent", "mem_total",
+        "processes"} where processes is a list of {"pid", "name",
+        "cpu_percent", "rss", "mem_percent"}. cpu_percent is None on
+        the very first call, when there is nothing to compare with.
+        """
+        now = time.time()
+        busy, total = read_cpu_times()
+        meminfo = read_meminfo()
+        mem_total = meminfo.get("MemTotal", 0)
+        mem_available = meminfo.get("MemAvailable", meminfo.get("MemFree", 0))
+
+        cpu_percent = None
+        if self.prev_cpu and total > self.prev_cpu[1]:
+            cpu_percent = round(
+                (busy - self.prev_cpu[0]) / (total - self.prev_cpu[1]) * 100, 1
+            )
+        elapsed = now - self.prev_time if self.prev_time else 0
+
+        processes = []
+        current = {}
+        for pid in (list_pids() if self.track_processes else []):
+            stat = read_pid_stat(pid)
+            if stat is None:
+                continue
+            name, ticks, start_time, rss = stat
+            key = (int(pid), start_time)
+            current[key] = ticks
+            before = self.prev_procs.get(key)
+            proc_cpu = 0.0
+            if before is not None and elapsed > 0:
+                # Per-process percent is of one CPU, like top and psutil
+                proc_cpu = round((ticks - before) / CLK_TCK / elapsed * 100, 1)
+            processes.append({
+                "pid": int(pid),
+                "name": name,
+                "cpu_percent": proc_cpu,
+                "rss": rss,
+                "mem_percent": round(rss / mem_total * 100, 1) if mem_total else 0.0,
+                "start_time": start_time,
+            })
+
+        self.prev_cpu = (busy, total)
+        self.prev_time = now
+        self.prev_procs = current
+
+        return {
+            "ts": now,
+            "cpu_percent": cpu_percent,
+            "ram_percent": round((mem_total - mem_available) / mem_total * 100, 1) if mem_total else 0.0,
+            "mem_total": mem_total,
+            "processes": processes,
+        }
+
+# ── Network ───────────────────────────────────────────────
+TCP_ESTABLISHED = "01"
+
+def _hex_ip(value):
+    if len(value) == 8:
+        return socket.inet_ntop(socket.AF_INET, bytes.fromhex(value)[::-1])
+    # IPv6 is four 32-bit words, each in host (little endian) order
+    raw = b"".join(bytes.fromhex(value[i:i + 8])[::-1] for i in range(0, 32, 8))
+    if raw[:12] == b"\0" * 10 + b"\xff\xff":
+        return socket.inet_ntop(socket.AF_INET, raw[12:])
+    return socket.inet_ntop(socket.AF_INET6, raw)
+
+def read_tcp_connections():
+    """
+    {socket_inode: remote_ip} for every established TCP connection in
+    /proc/net/tcp and /proc/net/tcp6, loopback excluded.
+    """
+    connections = {}
+    for path in ("/proc/net/tcp", "/proc/net/tcp6"):
+        try:
+            with open(path) as f:
+                lines = f.readlines()[1:]
+        except OSError:
+            continue
+        for line in lines:
+            fields = line.split()
+            if len(fields) < 10 or fields[3] != TCP_ESTABLISHED:
+                continue
+            ip = _hex_ip(fields[2].split(":")[0])
+            if ip.startswith("127.") or ip == "::1":
+                continue
+            connections[int(fields[9])] = ip
+    return connections
+
+# sock_diag netlink constants (linux/sock_diag.h, linux/inet_diag.h)
+NETLINK_SOCK_DIAG = 4
+SOCK_DIAG_BY_FAMILY = 20
+NLM_F_REQUEST_DUMP = 0x301
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+INET_DIAG_INFO = 2
+TCPF_ESTABLISHED = 1 << 1
+# Offsets of the socket inode in inet_diag_msg, and of
+# tcpi_bytes_acked / tcpi_bytes_received in struct tcp_info
+DIAG_INODE_OFFSET = 68
+DIAG_MSG_SIZE = 72
+TCP_INFO_BYTES_OFFSET = 120
+
+def read_tcp_traffic():
+    """
+    {socket_inode: (bytes_sent, bytes_received)} for every established
+    TCP socket, from the kernel's sock_diag interface — one netlink
+    dump per address family, no per-process reads. Returns {} where
+    sock_diag is unavailable or the kernel predates the byte counters.
+    """
+    traffic = {}
+    try:
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_SOCK_DIAG)
+    except (OSError, AttributeError):
+        return traffic
+    try:
+        for family in (socket.AF_INET, socket.AF_INET6):
+            request = struct.pack(
+                "=BBBBI", family, socket.IPPROTO_TCP, 1 << (INET_DIAG_INFO - 1), 0, TCPF_ESTABLISHED
+            ) + b"\0" * 48
+            sock.send(struct.pack("=IHHII", 16 + len(request), SOCK_DIAG_BY_FAMILY, NLM_F_REQUEST_DUMP, 1, 0) + request)
+            done = False
+            while not done:
+                data = sock.recv(65536)
+                offset = 0
+                while offset + 16 <= len(data):
+                    length, kind = struct.unpack_from("=IH", data, offset)
+                    if kind in (NLMSG_DONE, NLMSG_ERROR) or length < 16:
+                        done = True
+                        break
+                    message = offset + 16
+                    inode = struct.unpack_from("=I", data, message + DIAG_INODE_OFFSET)[0]
+                    attr = message + DIAG_MSG_SIZE
+                    end = offset + length
+                    while attr + 4 <= end:
+                        attr_len, attr_type = struct.unpack_from("=HH", data, attr)
+                        if attr_len < 4:
+                            break
+                        if attr_type == INET_DIAG_INFO and attr_len - 4 >= TCP_INFO_BYTES_OFFSET + 16:
+                            traffic[inode] = struct.unpack_from("=QQ", data, attr + 4 + TCP_INFO_BYTES_OFFSET)
+                        attr += (attr_len + 3) & ~3
+                    offset += (length + 3) & ~3
+    except OSError:
+        pass
+    finally:
+        sock.close()
+    return traffic
+
+# A socket no likely owner accounts for is searched for in every
+# process's fds, but at most this often
+FULL_SWEEP_SECONDS = 600
+
+class ConnectionSampler:
+    """
+    Maps established connections to the processes that own them.
+
+    Finding a socket's owner means reading fd links, so owners are cached
+    by socket inode as (pid, start_time) and fds are only read for a
+    socket that is not in the cache. Even then only the likely owners are
+    walked: processes started since they were last walked, and processes
+    that already own connections. A socket neither group owns waits for
+    a sweep of every process, run at most every FULL_SWEEP_SECONDS, and
+    is not searched for again if that finds nothing either (other users'
+    processes). A cached owner whose (pid, start_time) is no longer
+    running is dropped, so a recycled PID never inherits an old
+    process's sockets or name.
+
+    Each sample also leaves in .traffic the bytes every app sent and
+    received since the previous sample: the growth of its sockets' byte
+    counters, counting a socket opened in between from zero. Bytes a
+    socket moved after the last sample but before it closed are missed.
+    """
+
+    def __init__(self):
+        # inode -> (pid, start_time)
+        self.owners = {}
+        # Sockets the full sweep could not find an owner for
+        self.unowned = set()
+        # Sockets waiting for the next full sweep
+        self.deferred = set()
+        self.last_sweep = 0
+        # (pid, start_time) of every process whose fds have been walked
+        self.walked = set()
+        # inode -> (bytes_sent, bytes_received) at the previous sample
+        self.prev_traffic = None
+        # name -> [bytes_sent, bytes_received] since the previous sample
+        self.traffic = {}
+
+    def _scan(self, wanted, processes):
+        for pid, start_time in processes:
+            if not wanted:
+                break
+            try:
+                fds = list(os.scandir("/proc/" + str(pid) + "/fd"))
+            except OSError:
+                continue
+            self.walked.add((pid, start_time))
+            for fd in fds:
+                try:
+                    link = os.readlink(fd.path)
+                except OSError:
+                    continue
+                if link.startswith("socket:["):
+                    inode = int(link[8:-1])
+                    if inode in wanted:
+                        self.owners[inode] = (pid, start_time)
+                        wanted.discard(inode)
+
+    def sample(self, processes, now=None):
+        """
+        processes: a Sampler's process list, used as the pid -> name
+        cache. Returns a list of (pid, name, remote_ip).
+        """
+        now = now or time.time()
+        names = {(p["pid"], p["start_time"]): p["name"] for p in processes}
+        connections = read_tcp_connections()
+        owners = {}
+        for inode in connections:
+            owner = self.owners.get(inode)
+            if owner is not None and owner in names:
+                owners[inode] = owner
+        self.owners = owners
+        self.walked &= set(names)
+        self.unowned &= set(connections)
+        self.deferred &= set(connections)
+        missing = set(connections) - set(owners) - self.unowned - self.deferred
+        if missing:
+            likely = (set(names) - self.walked) | set(owners.values())
+            self._scan(missing, likely)
+            if len(likely) == len(names):
+                # Every process was walked (the first sample), a sweep already
+                self.unowned |= missing
+                self.last_sweep = now
+            else:
+                self.deferred |= missing
+        if self.deferred and now - self.last_sweep >= FULL_SWEEP_SECONDS:
+            self._scan(self.deferred, set(names))
+            self.last_sweep = now
+            self.unowned |= self.deferred
+            self.deferred = set()
+        result = []
+        for inode, ip in connections.items():
+            owner = self.owners.get(inode)
+            if owner is not None and owner in names:
+                result.append((owner[0], names[owner], ip))
+
+        counters = read_tcp_traffic()
+        self.traffic = {}
+        if self.prev_traffic is not None:
+            for inode, (sent, received) in counters.items():
+                owner = self.owners.get(inode)
+                if owner is None or owner not in names:
+                    continue
+                sent_before, received_before = self.prev_traffic.get(inode, (0, 0))
+                usage = self.traffic.setdefault(names[owner], [0, 0])
+                usage[0] += max(0, sent - sent_before)
+                usage[1] += max(0, received - received_before)
+        self.prev_traffic = counters
+        return result
+
+# ── Pressure, Disk and Swap ───────────────────────────────
+# Device name prefixes left out of disk totals: virtual devices, and
+# device-mapper / md arrays whose I/O is already counted on their disks
+SKIP_DISKS = ("loop", "ram", "zram", "dm-", "md")
+SECTOR_SIZE = 512
+
+def read_pressure(resource):
+    """
+    Cumulative stall time in microseconds from /proc/pressure/<resource>
+    as {"some": us, "full": us}, or None without PSI (kernel < 4.20 or
+    psi=0).
+    """
+    try:
+        with open("/proc/pressure/" + resource) as f:
+            lines = f.read().split("\n")
+    except OSError:
+        return None
+    totals = {}
+    for line in lines:
+        parts = line.split()
+        if parts and parts[-1].startswith("total="):
+            totals[parts[0]] = int(parts[-1][6:])
+    return totals
+
+def read_diskstats():
+    """
+    (reads, sectors_read, read_ms, writes, sectors_written, write_ms)
+    summed over the physical disks in /proc/diskstats, or None where
+    it cannot be read (some containers).
+    """
+    try:
+        disks = set(name for name in os.listdir("/sys/block") if not name.startswith(SKIP_DISKS))
+    except OSError:
+        disks = None
+    try:
+        with open("/proc/diskstats") as f:
+            lines = f.read().split("\n")
+    except OSError:
+        return None
+    totals = [0] * 6
+    for line in lines:
+        fields = line.split()
+        if len(fields) < 11:
+            continue
+        name = fields[2]
+        if (name not in disks) if disks is not None else name.startswith(SKIP_DISKS):
+            continue
+        # reads completed, sectors read, ms reading, writes completed, sectors written, ms writing
+        for i, field in enumerate((3, 5, 6, 7, 9, 10)):
+            totals[i] += int(fields[field])
+    return totals
+
+def read_swap_pages():
+    """(pages swapped in, pages swapped out) since boot, or None without /proc/vmstat."""
+    try:
+        with open("/proc/vmstat") as f:
+            lines = f.read().split("\n")
+    except OSError:
+        return None
+    swap_in = swap_out = 0
+    for line in lines:
+        if line.startswith("pswpin "):
+            swap_in = int(line.split()[1])
+        elif line.startswith("pswpout "):
+            swap_out = int(line.split()[1])
+    return swap_in, swap_out
+
+class IoSampler:
+    """
+    Rates since the previous sample() for stall time, disk traffic and
+    swapping. Like Sampler, everything is a difference between two
+    readings, so the first call returns only None values. Whatever the
+    host does not expose (PSI, diskstats, vmstat) stays None as well.
+    """
+
+    PRESSURE = ["cpu", "memory", "io"]
+
+    def __init__(self):
+        self.prev = None
+
+    def sample(self):
+        """
+        Returns {"cpu_stall", "mem_stall", "io_stall"} as the percent of
+        wall time some task was stalled on that resource, "disk_read"
+        and "disk_write" in MB/s, "disk_latency" as average ms per
+        completed request, and "swap_in" / "swap_out" in KB/s.
+        """
+        now = time.time()
+        current = {
+            "pressure": dict((name, read_pressure(name)) for name in self.PRESSURE),
+            "disk": read_diskstats(),
+            "swap": read_swap_pages(),
+        }
+        result = dict.fromkeys([
+            "cpu_stall", "mem_stall", "io_stall", "disk_read", "disk_write",
+            "disk_latency", "swap_in", "swap_out"
+        ])
+        prev, self.prev = self.prev, (now, current)
+        if prev is None or now <= prev[0]:
+            return result
+        elapsed = now - prev[0]
+        before = prev[1]
+
+        for name, key in zip(self.PRESSURE, ["cpu_stall", "mem_stall", "io_stall"]):
+            total, old = current["pressure"][name], before["pressure"][name]
+            if total and old and "some" in total and "some" in old:
+                result[key] = round(min(100.0, (total["some"] - old["some"]) / (elapsed * 1000000) * 100), 2)
+
+        if current["disk"] and before["disk"]:
+            disk = [new - old for new, old in zip(current["disk"], before["disk"])]
+            reads, sectors_read, read_ms, writes, sectors_written, write_ms = disk
+            result["disk_read"] = round(sectors_read * SECTOR_SIZE / 1048576.0 / elapsed, 3)
+            result["disk_write"] = round(sectors_written * SECTOR_SIZE / 1048576.0 / elapsed, 3)
+            if reads + writes > 0:
+                result["disk_latency"] = round((read_ms + write_ms) / float(reads + writes), 2)
+
+        if current["swap"] and before["swap"]:
+            swap_in = current["swap"][0] - before["swap"][0]
+            swap_out = current["swap"][1] - before["swap"][1]
+            result["swap_in"] = round(swap_in * PAGE_SIZE / 1024.0 / elapsed, 1)
+            result["swap_out"] = round(swap_out * PAGE_SIZE / 1024.0 / elapsed, 1)
+        return result
@@ -0,0 +1,156 @@
+# plugins/scanner.py
+# Shared filesystem scanner for every plugin
+# Built on os.scandir. Directory listings are cached by directory
+# mtime and shared between plugins, so a folder that has not gained
+# or lost entries is never read twice — whoever walked it first
+# pays for the readdir, everyone after reuses it.
+
+import os
+import threading
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# mtime is the directory's own mtime. subdirs and files are the
+# entries that passed the walk's filters. markers is the subset of
+# the requested marker names (like ".git") present in the directory.
+DirInfo = namedtuple("DirInfo", "path depth mtime subdirs files markers")
+FileInfo = namedtuple("FileInfo", "path name mtime size inode ctime")
+
+DEFAULT_SKIP_DIRS = ["venv", ".venv", "node_modules", "__pycache__", ".git"]
+
+# dirpath -> {"mtime": float, "dirs": [names], "files": [names]},
+# least recently used first. Walks run on worker threads, so every
+# access goes through listing_lock.
+listing_cache = OrderedDict()
+listing_lock = threading.Lock()
+# Listings kept before the least recently used are dropped
+MAX_LISTINGS = 20000
+
+MAX_WORKERS = 4
+
+def skip_hidden(name):
+    return name.startswith(".") or name in DEFAULT_SKIP_DIRS
+
+def cached_listing(dirpath):
+    """The cached listing for dirpath, or None."""
+    with listing_lock:
+        cached = listing_cache.get(dirpath)
+        if cached is not None:
+            listing_cache.move_to_end(dirpath)
+        return cached
+
+def _store_listing(dirpath, listing):
+    # Caller holds listing_lock
+    listing_cache[dirpath] = listing
+    listing_cache.move_to_end(dirpath)
+    while len(listing_cache) > MAX_LISTINGS:
+        listing_cache.popitem(last=False)
+
+def list_dir(dirpath, dir_mtime):
+    """
+    Returns (subdir_names, file_names) for dirpath, unfiltered.
+    Reuses the cached listing while the directory mtime is unchanged —
+    a directory's mtime moves whenever an entry is added, removed or renamed.
+    """
+    cached = cached_listing(dirpath)
+    if cached and cached["mtime"] == dir_mtime:
+        return cached["dirs"], cached["files"]
+    dirs = []
+    files = []
+    with os.scandir(dirpath) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.name)
+                elif entry.is_file():
+                    files.append(entry.name)
+            except OSError:
+                pass
+    with listing_lock:
+        _store_listing(dirpath, {"mtime": dir_mtime, "dirs": dirs, "files": files})
+    return dirs, files
+
+def seed_listing(dirpath, mtime, dirs, files):
+    # Lets a plugin restore listings it persisted before a restart
+    with listing_lock:
+        if dirpath not in listing_cache:
+            _store_listing(dirpath, {"mtime": mtime, "dirs": list(dirs), "files": list(files)})
+
+def _stat_file(dirpath, name):
+    path = os.path.join(dirpath, name)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return FileInfo(path, name, st.st_mtime, st.st_size, st.st_ino, st.st_ctime)
+
+def _walk_root(root, extensions, skip_dir, max_depth, stat_files, markers):
+    results = []
+    stack = [(root, 0)]
+    while stack:
+        dirpath, depth = stack.pop()
+        try:
+            dir_mtime = os.stat(dirpath).st_mtime
+            dirs, files = list_dir(dirpath, dir_mtime)
+        except OSError:
+            continue
+
+        found = set(name for name in markers if name in dirs or name in files)
+        subdirs = [d for d in dirs if not skip_dir(d)]
+        if extensions is not None:
+            files = [f for f in files if os.path.splitext(f)[1].lower() in extensions]
+        if stat_files:
+            file_infos = [info for info in (_stat_file(dirpath, f) for f in files) if info]
+        else:
+            file_infos = [
+                FileInfo(os.path.join(dirpath, f), f, None, None, None, None) for f in files
+            ]
+
+        results.append(DirInfo(dirpath, depth, dir_mtime, subdirs, file_infos, found))
+        if max_depth is None or depth < max_depth:
+            stack.extend((os.path.join(dirpath, d), depth + 1) for d in subdirs)
+    return results
+
+def walk(roots, extensions=None, skip_dir=skip_hidden, max_depth=None,
+         stat_files=True, markers=()):
+    """
+    Walks every root and returns a list of DirInfo, one per directory.
+
+    extensions  only keep files with these extensions (lowercase, with dot)
+    skip_dir    skip_dir(name) -> True to not descend into a directory
+    max_depth   0 lists only the roots themselves, None means unlimited
+    stat_files  stat each kept file (mtime, size, inode, ctime)
+    markers     names to look for in each directory, like ".git"
+
+    Top level roots are walked in parallel on a small thread pool.
+    """
+    roots = [r for r in roots if os.path.isdir(r)]
+    if extensions is not None:
+        extensions = set(extensions)
+    if len(roots) <= 1:
+        return [
+            d for root in roots
+            for d in _walk_root(root, extensions, skip_dir, max_depth, stat_files, markers)
+        ]
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(roots))) as pool:
+        futures = [
+            pool.submit(_walk_root, root, extensions, skip_dir, max_depth, stat_files, markers)
+            for root in roots
+        ]
+        return [d for future in futures for d in future.result()]
+
+def find_marked_dirs(roots, marker, max_depth=None, skip_dir=skip_hidden):
+    """Directories under roots that contain marker, like ".git" for repos."""
+    found = []
+    seen = set()
+    for info in walk(roots, extensions=(), skip_dir=skip_dir,
+                     max_depth=max_depth, stat_files=False, markers=(marker,)):
+        if marker in info.markers and info.path not in seen:
+            seen.add(info.path)
+            found.append(info)
+    return found
+
+def list_files(folder, stat_files=False):
+    """Files directly inside folder (not recursive)."""
+    infos = walk([folder], skip_dir=lambda name: True, max_depth=0, stat_files=stat_files)
+    return infos[0].files if infos else []
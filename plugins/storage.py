@@ -0,0 +1,173 @@
+# plugins/storage.py
+# Shared SQLite access for every plugin
+# Each thread keeps one open connection per database instead of
+# connecting and closing around every query. Connections run in WAL
+# mode with synchronous=NORMAL, so readers never wait on writers.
+# Small, frequent inserts can go through a write queue that commits
+# them in batches from a single background thread.
+
+import os
+import time
+import queue
+import atexit
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+_local = threading.local()
+
+def db_path(name):
+    """Path of a database file in ~/myclaw."""
+    return os.path.expanduser("~/myclaw/" + name)
+
+def connect(path):
+    """
+    Returns this thread's connection to path, opening it on first use.
+    Do not close it — the next call from the same thread reuses it.
+    """
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conns[path] = conn
+    return conn
+
+@contextmanager
+def transaction(path):
+    """
+    with transaction(path) as conn: ...
+    Commits on success and rolls back on error, so a failed write never
+    leaves the thread's connection holding the write lock.
+    """
+    conn = connect(path)
+    try:
+        yield conn
+        conn.commit()
+    except:
+        conn.rollback()
+        raise
+
+def query(path, sql, params=()):
+    return connect(path).execute(sql, params).fetchall()
+
+def query_one(path, sql, params=()):
+    return connect(path).execute(sql, params).fetchone()
+
+# ── Migrations ────────────────────────────────────────────
+def migrate(path, steps):
+    """
+    Brings the database at path up to date. steps[i](cursor) upgrades
+    schema version i to i + 1 and is run once, inside a transaction,
+    only if PRAGMA user_version is still below i + 1.
+    """
+    conn = connect(path)
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= len(steps):
+        return version
+    # IMMEDIATE takes the write lock up front, so two threads starting
+    # up together run each step once instead of tripping over each other
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, step in enumerate(steps, 1):
+            if version < number:
+                step(conn.cursor())
+        conn.execute("PRAGMA user_version = " + str(max(version, len(steps))))
+        conn.commit()
+    except:
+        conn.rollback()
+        raise
+    return max(version, len(steps))
+
+# ── Write Queue ───────────────────────────────────────────
+class WriteQueue:
+    """
+    Collects writes for one database and commits them in batches from
+    a background thread: whatever arrives within `interval` seconds, up
+    to max_batch statements, lands in a single transaction.
+    """
+
+    def __init__(self, path, interval=1.0, max_batch=500):
+        self.path = path
+        self.interval = interval
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def put(self, sql, params=()):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+        self.queue.put((sql, params))
+
+    def flush(self, timeout=10):
+        """Blocks until everything queued so far is committed."""
+        if self.thread is None:
+            return
+        done = threading.Event()
+        self.queue.put((None, done))
+        done.wait(timeout)
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.time() + self.interval
+            while len(batch) < self.max_batch and batch[-1][0] is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.write([item for item in batch if item[0] is not None])
+            for sql, params in batch:
+                if sql is None:
+                    params.set()
+
+    def write(self, batch):
+        if not batch:
+            return
+        # Runs of the same statement go through one executemany
+        groups = []
+        for sql, params in batch:
+            if groups and groups[-1][0] == sql:
+                groups[-1][1].append(params)
+            else:
+                groups.append((sql, [params]))
+        try:
+            with transaction(self.path) as conn:
+                for sql, rows in groups:
+                    conn.executemany(sql, rows)
+            return
+        except Exception:
+            pass
+        # Something in the batch failed and rolled it all back, so
+        # replay it one statement at a time and lose only the bad ones
+        for sql, params in batch:
+            try:
+                with transaction(self.path) as conn:
+                    conn.execute(sql, params)
+            except Exception as e:
+                print("Storage write error (" + os.path.basename(self.path) + "): " + str(e))
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+def writer(path):
+    """The shared WriteQueue for path."""
+    with _writers_lock:
+        if path not in _writers:
+            _writers[path] = WriteQueue(path)
+        return _writers[path]
+
+@atexit.register
+def _flush_all():
+    for queue_ in list(_writers.values()):
+        queue_.flush(timeout=5)
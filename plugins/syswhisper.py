@@ -3,21 +3,29 @@
 # Reads Linux built-in logs. Zero monitoring overhead.
 # Background thread: 0.01% CPU, ~20MB RAM, 10MB/day storage
 
-import os
-import sqlite3
+import json
 import subprocess
 import threading
 import time
-import psutil
+from collections import deque
 from datetime import datetime, timedelta
 from plugins.base import Plugin
+from plugins import storage
+from plugins import procfs
+from plugins import metrics
+from plugins import anomaly
+# syswhisper has its own "events" table and variables, hence the alias
+from plugins import events as event_store
 
-DB_PATH = os.path.expanduser("~/myclaw/syswhisper.db")
+try:
+    from systemd import journal
+except ImportError:
+    journal = None
+
+DB_PATH = storage.db_path("syswhisper.db")
 
 # ── Database Setup ────────────────────────────────────────
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+def create_tables(c):
     c.execute("""
         CREATE TABLE IF NOT EXISTS snapshots (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -38,52 +46,241 @@ def init_db():
             description TEXT
         )
     """)
-    conn.commit()
-    conn.close()
+
+def create_metric_tables(c):
+    # One row per metric per finished 1-minute or 15-minute bucket
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS metrics (
+            tier INTEGER,
+            ts INTEGER,
+            metric TEXT,
+            min REAL,
+            max REAL,
+            avg REAL,
+            p95 REAL,
+            samples INTEGER,
+            PRIMARY KEY (tier, metric, ts)
+        ) WITHOUT ROWID
+    """)
+
+def create_process_tables(c):
+    # Process names are stored once and referenced by id
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS process_names (
+            id INTEGER PRIMARY KEY,
+            name TEXT UNIQUE NOT NULL
+        )
+    """)
+    # cpu is tenths of a percent of one core, rss is in KiB
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS process_samples (
+            name_id INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            pid INTEGER NOT NULL,
+            cpu INTEGER,
+            rss_kb INTEGER,
+            PRIMARY KEY (name_id, ts, pid)
+        ) WITHOUT ROWID
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_process_samples_ts ON process_samples (ts)")
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS process_connections (
+            name_id INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            remote_ip TEXT NOT NULL,
+            PRIMARY KEY (name_id, ts, remote_ip)
+        ) WITHOUT ROWID
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_process_connections_ts ON process_connections (ts)")
+
+def create_journal_tables(c):
+    # Journal entries are deduplicated by their cursor
+    c.execute("ALTER TABLE events ADD COLUMN event_key TEXT")
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_events_key ON events (event_key)")
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS journal_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            cursor TEXT
+        )
+    """)
+
+def create_trend_tables(c):
+    # Running least-squares sums of RSS (MB) against time (hours since
+    # first seen) for every process lifetime, so a leak's slope is a
+    # few arithmetic operations however many samples went into it
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS process_trends (
+            pid INTEGER NOT NULL,
+            start_time INTEGER NOT NULL,
+            name_id INTEGER NOT NULL,
+            first_ts INTEGER NOT NULL,
+            last_ts INTEGER NOT NULL,
+            n INTEGER NOT NULL,
+            s_t REAL NOT NULL,
+            s_r REAL NOT NULL,
+            s_tt REAL NOT NULL,
+            s_tr REAL NOT NULL,
+            s_rr REAL NOT NULL,
+            first_kb INTEGER,
+            last_kb INTEGER,
+            PRIMARY KEY (pid, start_time)
+        ) WITHOUT ROWID
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_process_trends_last ON process_trends (last_ts)")
+
+def create_network_tables(c):
+    # Per app and snapshot: open connections and distinct peers among them
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS app_network (
+            name_id INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            connections INTEGER NOT NULL,
+            peers INTEGER NOT NULL,
+            PRIMARY KEY (name_id, ts)
+        ) WITHOUT ROWID
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_app_network_ts ON app_network (ts)")
+
+def create_bandwidth_tables(c):
+    # Bytes each app sent and received, summed per BANDWIDTH_BUCKET
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS app_bandwidth (
+            bucket INTEGER NOT NULL,
+            name_id INTEGER NOT NULL,
+            sent INTEGER NOT NULL,
+            received INTEGER NOT NULL,
+            PRIMARY KEY (bucket, name_id)
+        ) WITHOUT ROWID
+    """)
+
+def init_db():
+    storage.migrate(DB_PATH, [
+        create_tables, create_metric_tables, create_process_tables,
+        create_journal_tables, create_trend_tables, create_network_tables,
+        create_bandwidth_tables
+    ])
+
+# ── Report State ──────────────────────────────────────────
+# Running aggregates the report is assembled from. The samplers keep
+# them current as data arrives, so answering a question reads memory
+# only and the LLM call is all that is left on the latency path.
+REPORT_HOURS = 6
+report_lock = threading.Lock()
+cpu_window = metrics.RollingWindow(REPORT_HOURS * 3600)
+ram_window = metrics.RollingWindow(REPORT_HOURS * 3600)
+# (ts, timestamp, event_type, description), newest first
+recent_events = deque(maxlen=20)
+# (ts, timestamp, notes), newest first
+recent_suspicious = deque(maxlen=50)
+# (ts, min, max, avg, p95) tier rows, oldest first
+recent_spikes = deque(maxlen=REPORT_HOURS * 60)
+recent_quarters = {"cpu": deque(maxlen=8), "io_stall": deque(maxlen=8)}
+# Query results refreshed by the background loop after every snapshot
+report_cache = {
+    "processes": [], "connections": [], "growth": [], "leaks": [],
+    "network_apps": [], "talkers_hour": [], "talkers_day": [], "api_failures": [],
+}
 
 # ── Data Collection ───────────────────────────────────────
+# Machine CPU is the average since the previous snapshot. Processes
+# come from the shared pass below.
+sampler = procfs.Sampler(processes=False)
+
+# Seconds between priming the sampler and the first snapshot
+WARMUP_SECONDS = 10
+
+# Processes stored per snapshot: the top N by CPU plus the top N by memory
+PROCESS_SAMPLE_LIMIT = 20
+
+# process name -> id in process_names, committed ids only
+name_ids = {}
+
+def intern_names(conn, names):
+    """
+    {name: id} for names, inserting the new ones inside conn's
+    transaction. Those ids are not cached until a later lookup finds
+    them committed, so a rollback never leaves a stale id behind.
+    """
+    ids = {}
+    for name in set(names):
+        if name in name_ids:
+            ids[name] = name_ids[name]
+            continue
+        row = conn.execute("SELECT id FROM process_names WHERE name = ?", (name,)).fetchone()
+        if row:
+            name_ids[name] = ids[name] = row[0]
+        else:
+            ids[name] = conn.execute("INSERT INTO process_names (name) VALUES (?)", (name,)).lastrowid
+    return ids
+
+def pick_processes(processes):
+    by_cpu = sorted(processes, key=lambda p: p["cpu_percent"], reverse=True)[:PROCESS_SAMPLE_LIMIT]
+    by_rss = sorted(processes, key=lambda p: p["rss"], reverse=True)[:PROCESS_SAMPLE_LIMIT]
+    picked = {p["pid"]: p for p in by_cpu + by_rss}
+    return list(picked.values())
+
+# One /proc pass over processes and their sockets serves both the
+# detector, which samples every DETECT_SECONDS, and the snapshots,
+# which reuse the detector's latest pass instead of walking /proc again
+process_sampler = procfs.Sampler()
+connection_sampler = procfs.ConnectionSampler()
+process_lock = threading.Lock()
+last_pass = {"ts": 0, "processes": [], "connections": [], "traffic": {}}
+
+def sample_processes():
+    """
+    Takes a fresh pass: {"ts", "processes", "connections", "traffic"},
+    where connections has a (process name, remote ip) per established
+    connection and traffic is each app's bytes since the previous pass.
+    """
+    with process_lock:
+        sample = process_sampler.sample()
+        try:
+            connections = [(name, ip) for pid, name, ip in connection_sampler.sample(sample["processes"])]
+            traffic = connection_sampler.traffic
+        except:
+            connections, traffic = [], {}
+        last_pass.update(ts=sample["ts"], processes=sample["processes"], connections=connections, traffic=traffic)
+        return dict(last_pass)
+
+def latest_processes(max_age):
+    """The latest pass, or a fresh one if the detector has not run for max_age seconds."""
+    with process_lock:
+        if time.time() - last_pass["ts"] <= max_age:
+            return dict(last_pass)
+    return sample_processes()
+
+def app_network_rows(connections, ids, ts):
+    # (name_id, ts, connections, peers) per app
+    per_app = {}
+    for name, ip in connections:
+        per_app.setdefault(name, []).append(ip)
+    return [(ids[name], ts, len(ips), len(set(ips))) for name, ips in per_app.items()]
+
 def collect_snapshot():
     try:
-        # CPU and RAM — instant, zero overhead
-        cpu = psutil.cpu_percent(interval=1)
-        ram = psutil.virtual_memory()
-        disk = psutil.disk_usage("/")
-
-        # Top 5 processes by CPU
-        processes = []
-        for proc in psutil.process_iter(["pid", "name", "cpu_percent", "memory_percent"]):
-            try:
-                processes.append(proc.info)
-            except:
-                pass
-        top = sorted(processes, key=lambda x: x["cpu_percent"], reverse=True)[:5]
-        top_str = "|".join([
-            p["name"] + ":" + str(round(p["cpu_percent"], 1)) + "%CPU:" + str(round(p["memory_percent"], 1)) + "%RAM"
-            for p in top
-        ])
+        # Straight from /proc, never waits
+        sample = sampler.sample()
+        cpu = sample["cpu_percent"] or 0.0
+        ram_percent = sample["ram_percent"]
+        disk_percent = procfs.disk_percent("/")
+
+        # Processes, CPU averaged over the detector's last interval
+        shared = latest_processes(2 * DETECT_SECONDS)
+        processes = shared["processes"]
 
         # Network connections — which apps are talking to internet
-        connections = []
-        try:
-            for conn in psutil.net_connections(kind="inet"):
-                if conn.status == "ESTABLISHED" and conn.raddr:
-                    try:
-                        proc = psutil.Process(conn.pid)
-                        connections.append(proc.name() + "->" + str(conn.raddr.ip))
-                    except:
-                        pass
-        except:
-            pass
-        net_str = "|".join(list(set(connections))[:10])
+        connection_list = shared["connections"]
+        connections = set(connection_list)
 
         # Suspicious notes
         suspicious = []
-        if cpu > 80:
+        if cpu > anomaly.CPU_ALERT:
             suspicious.append("HIGH_CPU:" + str(cpu) + "%")
-        if ram.percent > 85:
-            suspicious.append("HIGH_RAM:" + str(ram.percent) + "%")
-        if disk.percent > 90:
-            suspicious.append("HIGH_DISK:" + str(disk.percent) + "%")
+        if ram_percent > anomaly.RAM_ALERT:
+            suspicious.append("HIGH_RAM:" + str(ram_percent) + "%")
+        if disk_percent > anomaly.DISK_ALERT:
+            suspicious.append("HIGH_DISK:" + str(disk_percent) + "%")
 
         # Check for unusual processes (crypto miners, known bad)
         bad_names = ["xmrig", "minerd", "cpuminer", "ethminer"]
@@ -95,145 +292,771 @@ def collect_snapshot():
         suspicious_str = "|".join(suspicious)
 
         # Save to database
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("""
-            INSERT INTO snapshots
-            (timestamp, cpu_percent, ram_percent, disk_percent,
-             top_processes, network_connections, suspicious_notes)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
-            datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            cpu, ram.percent, disk.percent,
-            top_str, net_str, suspicious_str
-        ))
+        ts = int(sample["ts"])
+        picked = pick_processes(processes)
+        with storage.transaction(DB_PATH) as conn:
+            conn.execute("""
+                INSERT INTO snapshots
+                (timestamp, cpu_percent, ram_percent, disk_percent, suspicious_notes)
+                VALUES (?, ?, ?, ?, ?)
+            """, (
+                datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S"),
+                cpu, ram_percent, disk_percent, suspicious_str
+            ))
+            ids = intern_names(conn, [p["name"] for p in picked] + [name for name, _ in connections])
+            conn.executemany("""
+                INSERT OR REPLACE INTO process_samples (name_id, ts, pid, cpu, rss_kb)
+                VALUES (?, ?, ?, ?, ?)
+            """, [
+                (ids[p["name"]], ts, p["pid"], int(round(p["cpu_percent"] * 10)), p["rss"] // 1024)
+                for p in picked
+            ])
+            conn.executemany("""
+                INSERT OR IGNORE INTO process_connections (name_id, ts, remote_ip)
+                VALUES (?, ?, ?)
+            """, [(ids[name], ts, ip) for name, ip in connections])
+            conn.executemany("""
+                INSERT OR REPLACE INTO app_network (name_id, ts, connections, peers)
+                VALUES (?, ?, ?, ?)
+            """, app_network_rows(connection_list, ids, ts))
 
-        # Auto clean old data — keep only last 7 days
-        week_ago = (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d %H:%M:%S")
-        c.execute("DELETE FROM snapshots WHERE timestamp < ?", (week_ago,))
+            # Auto clean old data — keep only last 7 days
+            week_ago = (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d %H:%M:%S")
+            conn.execute("DELETE FROM snapshots WHERE timestamp < ?", (week_ago,))
+            cutoff = ts - 7 * 86400
+            conn.execute("DELETE FROM process_samples WHERE ts < ?", (cutoff,))
+            conn.execute("DELETE FROM process_connections WHERE ts < ?", (cutoff,))
+            conn.execute("DELETE FROM process_trends WHERE last_ts < ?", (cutoff,))
+            conn.execute("DELETE FROM app_network WHERE ts < ?", (cutoff,))
+            conn.execute("DELETE FROM app_bandwidth WHERE bucket < ?", (cutoff,))
+
+        latest = sorted(picked, key=lambda p: (p["cpu_percent"], p["rss"]), reverse=True)[:5]
+        with report_lock:
+            cpu_window.add(ts, cpu)
+            ram_window.add(ts, ram_percent)
+            report_cache["processes"] = [
+                (p["name"], p["cpu_percent"], round(p["rss"] / 1048576.0, 1)) for p in latest
+            ]
+            report_cache["connections"] = list(connections)[:5]
+            if suspicious_str:
+                recent_suspicious.appendleft((ts, datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S"), suspicious_str))
 
-        conn.commit()
-        conn.close()
 
     except Exception as e:
         print("SysWhisper snapshot error: " + str(e))
 
-def collect_events():
+# ── Journal Events ────────────────────────────────────────
+# The journal is read incrementally: every entry carries a cursor, the
+# last one read is saved, and the next read starts right after it, so
+# no entry is missed or read twice between runs. With no saved cursor
+# (first run, or the journal was rotated past it) the last 10 minutes
+# are read instead.
+JOURNAL_FIELDS = "MESSAGE,PRIORITY,SYSLOG_IDENTIFIER,UNIT,_SYSTEMD_UNIT,_TRANSPORT"
+FIRST_READ = "10 minutes ago"
+
+def load_journal_cursor():
+    row = storage.query_one(DB_PATH, "SELECT cursor FROM journal_state WHERE id = 1")
+    return row[0] if row else None
+
+def binding_entry(entry):
+    """
+    The binding converts fields to Python types; turn them back into
+    the strings journalctl prints so both readers look the same.
+    """
+    result = {}
+    for key, value in entry.items():
+        if isinstance(value, datetime):
+            # __REALTIME_TIMESTAMP, microseconds like journalctl's JSON
+            value = int(value.timestamp() * 1000000)
+        elif isinstance(value, bytes):
+            value = value.decode("utf-8", "replace")
+        result[key] = str(value)
+    return result
+
+def journal_entries(cursor):
+    """
+    Yields journal entries after cursor as dicts of strings, oldest
+    first. Uses the systemd binding when installed, journalctl otherwise.
+    """
+    if journal is not None:
+        reader = journal.Reader()
+        if cursor:
+            try:
+                reader.seek_cursor(cursor)
+            except (OSError, ValueError) as e:
+                raise LookupError("journal could not seek to the cursor: " + str(e))
+            # seek_cursor lands on the saved entry itself, which was already read.
+            # Anything else means it was rotated away, same as journalctl failing.
+            if not reader.get_next() or not reader.test_cursor(cursor):
+                raise LookupError("journal cursor no longer exists")
+        else:
+            reader.seek_realtime(datetime.now() - timedelta(minutes=10))
+        for entry in reader:
+            yield binding_entry(entry)
+        return
+    cmd = ["journalctl", "-o", "json", "--no-pager", "--output-fields=" + JOURNAL_FIELDS]
+    cmd += ["--after-cursor", cursor] if cursor else ["--since", FIRST_READ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    for line in proc.stdout:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        # Non UTF-8 messages come back as byte arrays
+        message = entry.get("MESSAGE")
+        if isinstance(message, list):
+            entry["MESSAGE"] = bytes(message).decode("utf-8", "replace")
+        yield entry
+    if proc.wait() != 0 and cursor:
+        raise LookupError(proc.stderr.read().strip() or "journalctl could not seek to the cursor")
+
+def classify_entry(entry):
+    """(event_type, description) for entries worth keeping, else None."""
+    message = entry.get("MESSAGE") or ""
+    if not isinstance(message, str):
+        return None
+    lower = message.lower()
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
+        priority = int(entry.get("PRIORITY", 6))
+    except ValueError:
+        priority = 6
+    kernel = entry.get("_TRANSPORT") == "kernel"
+    identifier = entry.get("SYSLOG_IDENTIFIER", "")
+    if (kernel and "out of memory" in lower) or (identifier == "systemd-oomd" and "killed" in lower):
+        return "OOM_KILLER", message
+    if (kernel and "segfault at" in lower) or (identifier == "systemd-coredump" and "dumped core" in lower):
+        return "SEGFAULT", message
+    if identifier == "systemd" and ("failed with result" in lower or lower.startswith("failed to start")):
+        unit = entry.get("UNIT") or entry.get("_SYSTEMD_UNIT") or ""
+        if unit and not message.startswith(unit):
+            message = unit + ": " + message
+        return "SERVICE_FAILED", message
+    if priority <= 3:
+        return ("KERNEL_ERROR" if kernel else "SYSTEM_ERROR"), message
+    return None
 
-        # Read recent journal events (last 10 minutes)
-        result = subprocess.run(
-            'journalctl --since "10 minutes ago" -p err -o short --no-pager',
-            shell=True, capture_output=True, text=True
-        )
-        if result.stdout.strip():
-            lines = result.stdout.strip().split("\n")
-            for line in lines[:5]:
-                if line.strip():
-                    c.execute("""
-                        INSERT INTO events (timestamp, event_type, description)
-                        VALUES (?, ?, ?)
-                    """, (
-                        datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                        "SYSTEM_ERROR",
-                        line[:500]
-                    ))
-
-        # Check for OOM killer events
-        oom = subprocess.run(
-            'journalctl --since "10 minutes ago" | grep -i "out of memory" --no-pager',
-            shell=True, capture_output=True, text=True
-        )
-        if oom.stdout.strip():
-            c.execute("""
-                INSERT INTO events (timestamp, event_type, description)
-                VALUES (?, ?, ?)
-            """, (
-                datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "OOM_KILLER",
-                "System killed a process due to low memory"
+def collect_events():
+    try:
+        cursor = load_journal_cursor()
+        rows = []
+        last_cursor = cursor
+        try:
+            entries = list(journal_entries(cursor))
+        except LookupError as e:
+            # The saved entry was rotated away, start over from recent history
+            print("SysWhisper journal cursor reset: " + str(e))
+            cursor = None
+            entries = list(journal_entries(None))
+        for entry in entries:
+            last_cursor = entry.get("__CURSOR") or last_cursor
+            found = classify_entry(entry)
+            if found is None:
+                continue
+            event_type, description = found
+            try:
+                ts = int(entry["__REALTIME_TIMESTAMP"]) / 1000000.0
+            except (KeyError, ValueError):
+                ts = time.time()
+            rows.append((
+                datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S"),
+                event_type,
+                description[:500],
+                entry.get("__CURSOR"),
+                ts
             ))
 
-        conn.commit()
-        conn.close()
+        new_rows = []
+        with storage.transaction(DB_PATH) as conn:
+            for timestamp, event_type, description, key, ts in rows:
+                # The journal cursor is unique per entry, so a re-read inserts nothing
+                inserted = conn.execute("""
+                    INSERT OR IGNORE INTO events (timestamp, event_type, description, event_key)
+                    VALUES (?, ?, ?, ?)
+                """, (timestamp, event_type, description, key)).rowcount
+                if inserted:
+                    new_rows.append((timestamp, event_type, description, ts))
+            if last_cursor and last_cursor != cursor:
+                conn.execute("""
+                    INSERT INTO journal_state (id, cursor) VALUES (1, ?)
+                    ON CONFLICT (id) DO UPDATE SET cursor = excluded.cursor
+                """, (last_cursor,))
+        if new_rows:
+            with report_lock:
+                for timestamp, event_type, description, ts in new_rows:
+                    recent_events.appendleft((ts, timestamp, event_type, description))
 
     except Exception as e:
         print("SysWhisper events error: " + str(e))
 
+# ── High Resolution Metrics ───────────────────────────────
+# Machine totals are sampled every few seconds into a ring buffer
+# and only their per-bucket summaries reach SQLite
+TICK_SECONDS = 5
+# A minute whose p95 CPU is at least this counts as a spike
+CPU_SPIKE = 80
+RING_SIZE = 720  # one hour of ticks
+# Bucket size in seconds -> how long its rows are kept
+TIERS = {60: 2 * 86400, 900: 90 * 86400}
+METRICS = [
+    "cpu", "ram",
+    # Percent of wall time some task was stalled (PSI "some")
+    "cpu_stall", "mem_stall", "io_stall",
+    # MB/s, average ms per request, KB/s
+    "disk_read", "disk_write", "disk_latency", "swap_in", "swap_out",
+]
+
+tick_sampler = procfs.Sampler(processes=False)
+io_sampler = procfs.IoSampler()
+# Last 10 minutes of every metric, for "what is happening right now"
+PRESSURE_MINUTES = 10
+pressure_windows = dict((metric, metrics.RollingWindow(PRESSURE_MINUTES * 60)) for metric in METRICS)
+ring = metrics.MetricRing(METRICS, RING_SIZE)
+# Start of the last bucket written, per tier
+flushed = {}
+
+def tick():
+    sample = tick_sampler.sample()
+    values = io_sampler.sample()
+    values["cpu"] = sample["cpu_percent"]
+    values["ram"] = sample["ram_percent"]
+    ring.append(sample["ts"], values)
+    with report_lock:
+        for metric in METRICS:
+            pressure_windows[metric].add(sample["ts"], values.get(metric))
+    for detector, value in [(cpu_detector, sample["cpu_percent"]), (ram_detector, sample["ram_percent"])]:
+        message = detector.update(value)
+        if message:
+            anomaly.raise_alert(detector.label, message, sample["ts"])
+    return sample["ts"]
+
+def flush_tiers(now):
+    rows = []
+    expired = []
+    for tier, keep in TIERS.items():
+        current = int(now // tier * tier)
+        last = flushed.get(tier)
+        start = current - tier if last is None else last + tier
+        if start >= current:
+            continue
+        for bucket in range(start, current, tier):
+            window = ring.window(bucket, bucket + tier)
+            for metric in METRICS:
+                summary = metrics.summarize(window[metric])
+                if summary:
+                    rows.append((tier, bucket, metric) + summary)
+        flushed[tier] = current - tier
+        expired.append((tier, int(now - keep)))
+    with report_lock:
+        for tier, bucket, metric, low, high, avg, p95, samples in rows:
+            if tier == 60 and metric == "cpu" and p95 >= CPU_SPIKE:
+                recent_spikes.append((bucket, low, high, avg, p95))
+            elif tier == 900 and metric in recent_quarters:
+                recent_quarters[metric].append((bucket, low, high, avg, p95))
+    if not rows and not expired:
+        return
+    with storage.transaction(DB_PATH) as conn:
+        conn.executemany("""
+            INSERT OR REPLACE INTO metrics (tier, ts, metric, min, max, avg, p95, samples)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        conn.executemany("DELETE FROM metrics WHERE tier = ? AND ts < ?", expired)
+
+def metrics_loop():
+    tick_sampler.sample()
+    io_sampler.sample()
+    while True:
+        time.sleep(TICK_SECONDS)
+        try:
+            flush_tiers(tick())
+            anomaly.heartbeat("metrics")
+        except Exception as e:
+            print("SysWhisper metrics error: " + str(e))
+
+# ── Anomaly Detection ─────────────────────────────────────
+# Baselines learn from the 5-second ticks, one minute unusual in a row alerts
+cpu_detector = anomaly.StreamDetector("CPU", floor=50, hard_limit=anomaly.CPU_ALERT, sustain=12)
+ram_detector = anomaly.StreamDetector("RAM", floor=60, hard_limit=anomaly.RAM_ALERT, sustain=12)
+
+# Processes and connections are checked on their own, slower cycle
+DETECT_SECONDS = 30
+hog_detector = anomaly.HogDetector()
+peer_detector = anomaly.PeerDetector()
+
+def seed_peer_detector():
+    # Peers seen before a restart are not new
+    rows = storage.query(DB_PATH, """
+        SELECT n.name, c.remote_ip, MIN(c.ts)
+        FROM process_connections c JOIN process_names n ON n.id = c.name_id
+        GROUP BY c.name_id, c.remote_ip
+    """)
+    for app, ip, ts in rows:
+        peer_detector.seed(app, ip, ts)
+
+# Processes smaller than this are not worth a trend row
+TREND_MIN_KB = 10 * 1024
+
+def update_trends(processes, now):
+    tracked = [p for p in processes if p["rss"] // 1024 >= TREND_MIN_KB]
+    ts = int(now)
+    with storage.transaction(DB_PATH) as conn:
+        ids = intern_names(conn, [p["name"] for p in tracked])
+        rows = []
+        for p in tracked:
+            kb = p["rss"] // 1024
+            mb = kb / 1024.0
+            rows.append((p["pid"], p["start_time"], ids[p["name"]], ts, ts, mb, mb * mb, kb, kb))
+        # t is hours since the lifetime's first sample, so the first row adds 0 to every t sum
+        conn.executemany("""
+            INSERT INTO process_trends
+            (pid, start_time, name_id, first_ts, last_ts, n, s_t, s_r, s_tt, s_tr, s_rr, first_kb, last_kb)
+            VALUES (?, ?, ?, ?, ?, 1, 0, ?, 0, 0, ?, ?, ?)
+            ON CONFLICT (pid, start_time) DO UPDATE SET
+                s_t = s_t + (excluded.last_ts - first_ts) / 3600.0,
+                s_tt = s_tt + ((excluded.last_ts - first_ts) / 3600.0) * ((excluded.last_ts - first_ts) / 3600.0),
+                s_tr = s_tr + ((excluded.last_ts - first_ts) / 3600.0) * excluded.s_r,
+                s_r = s_r + excluded.s_r,
+                s_rr = s_rr + excluded.s_rr,
+                n = n + 1,
+                last_ts = excluded.last_ts,
+                last_kb = excluded.last_kb
+        """, rows)
+
+def drop_previous_boot_trends():
+    # start_time counts ticks since boot, so early-boot processes like
+    # PID 1 get the same (pid, start_time) after a reboot. Lifetimes last
+    # seen before this boot are over and must not be extended.
+    with storage.transaction(DB_PATH) as conn:
+        conn.execute("DELETE FROM process_trends WHERE last_ts < ?", (procfs.boot_time(),))
+
+BANDWIDTH_BUCKET = 300
+
+def save_bandwidth(traffic, now):
+    # traffic: name -> [sent, received] since the previous detector pass
+    traffic = {name: usage for name, usage in traffic.items() if usage[0] or usage[1]}
+    if not traffic:
+        return
+    bucket = int(now // BANDWIDTH_BUCKET * BANDWIDTH_BUCKET)
+    with storage.transaction(DB_PATH) as conn:
+        ids = intern_names(conn, list(traffic))
+        conn.executemany("""
+            INSERT INTO app_bandwidth (bucket, name_id, sent, received)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (bucket, name_id) DO UPDATE SET
+                sent = sent + excluded.sent,
+                received = received + excluded.received
+        """, [(bucket, ids[name], sent, received) for name, (sent, received) in traffic.items()])
+
+def detect():
+    shared = sample_processes()
+    now = shared["ts"]
+    processes = shared["processes"]
+    update_trends(processes, now)
+    for p, minutes in hog_detector.update(processes, now):
+        anomaly.raise_alert(
+            "hog:" + p["name"],
+            p["name"] + " (PID " + str(p["pid"]) + ") has used " + str(p["cpu_percent"]) +
+            "% CPU for " + str(minutes) + " minutes", now
+        )
+    # Leaks are read off the lifetime fits update_trends just extended
+    for name, pid, rate, fit, hours, first_mb, last_mb, hours_to_oom in get_memory_leaks():
+        anomaly.raise_alert(
+            "leak:" + name,
+            name + " (PID " + str(pid) + ") memory keeps growing: " + str(first_mb) +
+            " MB -> " + str(last_mb) + " MB over " + str(hours) + " hours (" + str(rate) + " MB/hour)", now
+        )
+    for app, ip in peer_detector.update(set(shared["connections"]), now):
+        anomaly.raise_alert(
+            "peer:" + app + ":" + ip,
+            app + " connected to a new address: " + ip, now
+        )
+    save_bandwidth(shared["traffic"], now)
+    disk = procfs.disk_percent("/")
+    if disk > anomaly.DISK_ALERT:
+        anomaly.raise_alert("disk", "Disk almost full: " + str(disk) + "%", now)
+
+def detect_loop():
+    try:
+        seed_peer_detector()
+    except Exception as e:
+        print("SysWhisper detector seed error: " + str(e))
+    try:
+        drop_previous_boot_trends()
+    except Exception as e:
+        print("SysWhisper trend cleanup error: " + str(e))
+    sample_processes()
+    while True:
+        time.sleep(DETECT_SECONDS)
+        try:
+            detect()
+            anomaly.heartbeat("detector")
+        except Exception as e:
+            print("SysWhisper detector error: " + str(e))
+
 # ── Background Thread — Runs Every 5 Minutes ─────────────
 def background_loop():
     init_db()
     print("SysWhisper: background monitor started (ultra lightweight)")
+    # Loaded before the loops start, so nothing they add is read back in twice
+    try:
+        load_report_state()
+    except Exception as e:
+        print("SysWhisper report state error: " + str(e))
+    threading.Thread(target=metrics_loop, daemon=True).start()
+    threading.Thread(target=detect_loop, daemon=True).start()
+    # The first snapshot needs earlier CPU counters to diff against
+    sampler.sample()
+    time.sleep(WARMUP_SECONDS)
     while True:
         collect_snapshot()
         collect_events()
+        try:
+            refresh_report_cache()
+        except Exception as e:
+            print("SysWhisper report cache error: " + str(e))
         time.sleep(300)  # 5 minutes — completely invisible to user
 
-# Start background thread when plugin loads
-monitor_thread = threading.Thread(target=background_loop, daemon=True)
-monitor_thread.start()
-
 # ── Query Functions ───────────────────────────────────────
 def get_recent_snapshots(hours=1):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
         since = (datetime.now() - timedelta(hours=hours)).strftime("%Y-%m-%d %H:%M:%S")
-        c.execute("""
+        return storage.query(DB_PATH, """
             SELECT timestamp, cpu_percent, ram_percent,
                    top_processes, network_connections, suspicious_notes
             FROM snapshots
             WHERE timestamp > ?
             ORDER BY timestamp DESC
         """, (since,))
-        rows = c.fetchall()
-        conn.close()
-        return rows
     except:
         return []
 
 def get_recent_events(hours=24):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
         since = (datetime.now() - timedelta(hours=hours)).strftime("%Y-%m-%d %H:%M:%S")
-        c.execute("""
+        return storage.query(DB_PATH, """
             SELECT timestamp, event_type, description
             FROM events
             WHERE timestamp > ?
             ORDER BY timestamp DESC
             LIMIT 20
         """, (since,))
-        rows = c.fetchall()
-        conn.close()
-        return rows
     except:
         return []
 
 def get_suspicious_activity(hours=24):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
         since = (datetime.now() - timedelta(hours=hours)).strftime("%Y-%m-%d %H:%M:%S")
-        c.execute("""
+        return storage.query(DB_PATH, """
             SELECT timestamp, suspicious_notes
             FROM snapshots
             WHERE timestamp > ?
             AND suspicious_notes != ""
             ORDER BY timestamp DESC
         """, (since,))
-        rows = c.fetchall()
-        conn.close()
-        return rows
     except:
         return []
 
-def build_intelligence_report(query, groq_client=None):
-    snapshots = get_recent_snapshots(hours=6)
+def get_latest_processes(limit=5):
+    # (name, cpu_percent, rss_mb) from the newest snapshot, busiest first
+    try:
+        rows = storage.query(DB_PATH, """
+            SELECT n.name, s.cpu, s.rss_kb
+            FROM process_samples s JOIN process_names n ON n.id = s.name_id
+            WHERE s.ts = (SELECT MAX(ts) FROM process_samples)
+            ORDER BY s.cpu DESC, s.rss_kb DESC
+            LIMIT ?
+        """, (limit,))
+        return [(name, cpu / 10.0, round(rss_kb / 1024.0, 1)) for name, cpu, rss_kb in rows]
+    except:
+        return []
+
+def get_latest_connections(limit=5):
+    try:
+        return storage.query(DB_PATH, """
+            SELECT n.name, c.remote_ip
+            FROM process_connections c JOIN process_names n ON n.id = c.name_id
+            WHERE c.ts = (SELECT MAX(ts) FROM process_connections)
+            LIMIT ?
+        """, (limit,))
+    except:
+        return []
+
+def get_network_apps(hours=1, limit=5):
+    """
+    Apps with network activity in the window, busiest first:
+    (name, distinct_peers, avg_connections, max_connections, samples)
+    """
+    try:
+        since = int(time.time() - hours * 3600)
+        rows = storage.query(DB_PATH, """
+            SELECT n.name,
+                   (SELECT COUNT(DISTINCT c.remote_ip) FROM process_connections c
+                    WHERE c.name_id = a.name_id AND c.ts >= ?),
+                   AVG(a.connections), MAX(a.connections), COUNT(*)
+            FROM app_network a JOIN process_names n ON n.id = a.name_id
+            WHERE a.ts >= ?
+            GROUP BY a.name_id
+            ORDER BY SUM(a.connections) DESC
+            LIMIT ?
+        """, (since, since, limit))
+        return [
+            (name, peers, round(avg, 1), high, samples)
+            for name, peers, avg, high, samples in rows
+        ]
+    except:
+        return []
+
+def get_top_talkers(hours=1, limit=5):
+    """Apps that moved the most data in the window: (name, sent, received) in bytes."""
+    try:
+        since = int(time.time() - hours * 3600) // BANDWIDTH_BUCKET * BANDWIDTH_BUCKET
+        return storage.query(DB_PATH, """
+            SELECT n.name, SUM(b.sent), SUM(b.received)
+            FROM app_bandwidth b JOIN process_names n ON n.id = b.name_id
+            WHERE b.bucket >= ?
+            GROUP BY b.name_id
+            ORDER BY SUM(b.sent) + SUM(b.received) DESC
+            LIMIT ?
+        """, (since, limit))
+    except:
+        return []
+
+def format_bytes(count):
+    for unit in ["B", "KB", "MB", "GB"]:
+        if count < 1024 or unit == "GB":
+            return str(round(count, 1)) + " " + unit
+        count /= 1024.0
+
+def get_process_history(name, hours=24):
+    # (ts, cpu_percent, rss_mb) summed over every PID with that name
+    try:
+        since = int(time.time() - hours * 3600)
+        rows = storage.query(DB_PATH, """
+            SELECT s.ts, SUM(s.cpu), SUM(s.rss_kb)
+            FROM process_samples s
+            WHERE s.name_id = (SELECT id FROM process_names WHERE name = ?)
+            AND s.ts >= ?
+            GROUP BY s.ts
+            ORDER BY s.ts
+        """, (name, since))
+        return [(ts, cpu / 10.0, round(rss_kb / 1024.0, 1)) for ts, cpu, rss_kb in rows]
+    except:
+        return []
+
+def get_memory_growth(hours=6, limit=5):
+    # Processes whose memory grew the most between their first and
+    # last sample in the window: (name, first_mb, last_mb, samples)
+    try:
+        since = int(time.time() - hours * 3600)
+        rows = storage.query(DB_PATH, """
+            WITH per_ts AS (
+                SELECT name_id, ts, SUM(rss_kb) AS rss
+                FROM process_samples
+                WHERE ts >= ?
+                GROUP BY name_id, ts
+            ), ends AS (
+                SELECT name_id,
+                       FIRST_VALUE(rss) OVER w AS first_rss,
+                       LAST_VALUE(rss) OVER w AS last_rss,
+                       COUNT(*) OVER w AS samples
+                FROM per_ts
+                WINDOW w AS (
+                    PARTITION BY name_id ORDER BY ts
+                    ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
+                )
+            )
+            SELECT DISTINCT n.name, e.first_rss, e.last_rss, e.samples
+            FROM ends e JOIN process_names n ON n.id = e.name_id
+            WHERE e.samples >= 3 AND e.last_rss > e.first_rss
+            ORDER BY e.last_rss - e.first_rss DESC
+            LIMIT ?
+        """, (since, limit))
+        return [
+            (name, round(first / 1024.0, 1), round(last / 1024.0, 1), samples)
+            for name, first, last, samples in rows
+        ]
+    except:
+        return []
+
+# A lifetime needs this many samples, hours and MB/hour of growth,
+# and a fit (r squared) this close to a straight line to count as a leak
+LEAK_MIN_SAMPLES = 20
+LEAK_MIN_HOURS = 0.5
+LEAK_MIN_SLOPE = 5.0
+LEAK_MIN_FIT = 0.8
+
+def get_memory_leaks(limit=5):
+    """
+    Running processes ranked by RSS growth, fitted over each one's
+    whole lifetime: (name, pid, mb_per_hour, fit, hours, first_mb,
+    last_mb, hours_to_oom). hours_to_oom is when available memory runs
+    out at that rate, or None if it cannot be read.
+    """
+    try:
+        now = int(time.time())
+        rows = storage.query(DB_PATH, """
+            SELECT name, pid, slope, num * num / (den_t * den_r), hours, first_kb, last_kb
+            FROM (
+                SELECT n.name, t.pid,
+                       (t.n * t.s_tr - t.s_t * t.s_r) AS num,
+                       (t.n * t.s_tt - t.s_t * t.s_t) AS den_t,
+                       (t.n * t.s_rr - t.s_r * t.s_r) AS den_r,
+                       (t.n * t.s_tr - t.s_t * t.s_r) / (t.n * t.s_tt - t.s_t * t.s_t) AS slope,
+                       (t.last_ts - t.first_ts) / 3600.0 AS hours,
+                       t.first_kb, t.last_kb
+                FROM process_trends t JOIN process_names n ON n.id = t.name_id
+                WHERE t.last_ts >= ? AND t.n >= ? AND t.last_ts - t.first_ts >= ?
+            )
+            WHERE den_t > 0 AND den_r > 0 AND slope >= ?
+              AND num * num / (den_t * den_r) >= ?
+            ORDER BY slope DESC
+            LIMIT ?
+        """, (
+            now - 3 * DETECT_SECONDS, LEAK_MIN_SAMPLES, int(LEAK_MIN_HOURS * 3600),
+            LEAK_MIN_SLOPE, LEAK_MIN_FIT, limit
+        ))
+        try:
+            meminfo = procfs.read_meminfo()
+            available_mb = meminfo.get("MemAvailable", meminfo.get("MemFree", 0)) / 1024.0 / 1024.0
+        except:
+            available_mb = None
+        return [
+            (
+                name, pid, round(slope, 1), round(fit, 2), round(hours, 1),
+                round(first_kb / 1024.0, 1), round(last_kb / 1024.0, 1),
+                round(available_mb / slope, 1) if available_mb is not None else None
+            )
+            for name, pid, slope, fit, hours, first_kb, last_kb in rows
+        ]
+    except:
+        return []
+
+def load_report_state():
+    # Fill the running aggregates from what is on disk after a restart
+    snapshots = get_recent_snapshots(hours=REPORT_HOURS)
     events = get_recent_events(hours=24)
     suspicious = get_suspicious_activity(hours=24)
+    spikes = get_cpu_spikes(hours=REPORT_HOURS)
+    quarters = dict((metric, get_metric_buckets(metric, 900, hours=REPORT_HOURS)) for metric in recent_quarters)
+    processes = get_latest_processes()
+    connections = get_latest_connections()
+
+    def epoch(timestamp):
+        return datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S").timestamp()
+
+    with report_lock:
+        for timestamp, cpu, ram, _, _, _ in reversed(snapshots):
+            cpu_window.add(epoch(timestamp), cpu)
+            ram_window.add(epoch(timestamp), ram)
+        recent_events.extend((epoch(t), t, kind, description) for t, kind, description in events)
+        recent_suspicious.extend((epoch(t), t, notes) for t, notes in suspicious)
+        recent_spikes.extend(spikes)
+        for metric, rows in quarters.items():
+            recent_quarters[metric].extend(rows)
+        report_cache["processes"] = processes
+        report_cache["connections"] = connections
+    refresh_report_cache()
+
+def refresh_report_cache():
+    # Whole-window queries, rerun in the background after each snapshot
+    results = {
+        "growth": get_memory_growth(hours=REPORT_HOURS),
+        "leaks": get_memory_leaks(),
+        "network_apps": get_network_apps(hours=1),
+        "talkers_hour": get_top_talkers(hours=1),
+        "talkers_day": get_top_talkers(hours=24),
+        "api_failures": get_api_failures(hours=24),
+    }
+    with report_lock:
+        report_cache.update(results)
+
+def report_state():
+    """Everything build_intelligence_report needs, copied out under the lock."""
+    now = time.time()
+    with report_lock:
+        for window in [cpu_window, ram_window] + list(pressure_windows.values()):
+            window.expire(now)
+        state = dict(report_cache)
+        state["samples"] = len(cpu_window)
+        state["cpu"] = (cpu_window.average(), cpu_window.peak())
+        state["ram"] = (ram_window.average(), ram_window.peak())
+        state["events"] = [e[1:] for e in recent_events if e[0] >= now - 86400]
+        state["suspicious"] = [s[1:] for s in recent_suspicious if s[0] >= now - 86400]
+        state["spikes"] = [row for row in recent_spikes if row[0] >= now - REPORT_HOURS * 3600]
+        state["quarters"] = list(recent_quarters["cpu"])
+        state["io_quarters"] = list(recent_quarters["io_stall"])
+        state["pressure"] = dict(
+            (metric, window.average())
+            for metric, window in pressure_windows.items() if len(window)
+        )
+    return state
+
+def get_metric_buckets(metric, tier=60, hours=6):
+    try:
+        since = int(time.time() - hours * 3600)
+        return storage.query(DB_PATH, """
+            SELECT ts, min, max, avg, p95
+            FROM metrics
+            WHERE tier = ? AND metric = ? AND ts >= ?
+            ORDER BY ts
+        """, (tier, metric, since))
+    except:
+        return []
+
+def get_cpu_spikes(hours=6, threshold=CPU_SPIKE):
+    # Minutes whose p95 CPU was above threshold. Spikes this short
+    # are invisible in the 5-minute snapshots.
+    return [row for row in get_metric_buckets("cpu", 60, hours) if row[4] >= threshold]
+
+# A failure is matched with the process snapshot nearest to it, this close
+API_FAILURE_WINDOW = 300
+
+def get_api_failures(hours=24):
+    """
+    Each failed API call with the top processes from the snapshot
+    closest to it: (time, api, [(name, cpu_percent, rss_mb)]).
+    """
+    try:
+        since = int(time.time() - hours * 3600)
+        failures = []
+        for fail_ts, api, value, payload in reversed(event_store.query("api_error", since)):
+            nearest = storage.query(DB_PATH, """
+                SELECT ts FROM process_samples
+                WHERE ts BETWEEN ? AND ?
+                ORDER BY ABS(ts - ?)
+                LIMIT 1
+            """, (fail_ts - API_FAILURE_WINDOW, fail_ts + API_FAILURE_WINDOW, fail_ts))
+            processes = []
+            if nearest:
+                processes = [
+                    (name, cpu / 10.0, round(rss_kb / 1024.0, 1))
+                    for name, cpu, rss_kb in storage.query(DB_PATH, """
+                        SELECT n.name, s.cpu, s.rss_kb
+                        FROM process_samples s JOIN process_names n ON n.id = s.name_id
+                        WHERE s.ts = ?
+                        ORDER BY s.cpu DESC
+                        LIMIT 5
+                    """, (nearest[0][0],))
+                ]
+            failures.append((datetime.fromtimestamp(fail_ts).strftime("%Y-%m-%d %H:%M:%S"), api, processes))
+        return failures
+    except:
+        return []
+
+def build_intelligence_report(query, groq_client=None):
+    state = report_state()
+    events = state["events"]
+    suspicious = state["suspicious"]
+    api_failures = state["api_failures"]
+    spikes = state["spikes"]
+    quarters = state["quarters"]
+    growth = state["growth"]
+    leaks = state["leaks"]
+    network_apps = state["network_apps"]
+    talkers_hour = state["talkers_hour"]
+    talkers_day = state["talkers_day"]
+    pressure = state["pressure"]
+    io_quarters = state["io_quarters"]
+    snapshots = state["samples"]
 
     if not snapshots:
         return "SysWhisper has been running for less than 5 minutes. Ask again soon — it needs time to collect data."
@@ -243,27 +1066,82 @@ def build_intelligence_report(query, groq_client=None):
 
     # Summarize snapshots
     if snapshots:
-        cpu_vals = [s[1] for s in snapshots]
-        ram_vals = [s[2] for s in snapshots]
-        avg_cpu = round(sum(cpu_vals) / len(cpu_vals), 1)
-        max_cpu = round(max(cpu_vals), 1)
-        avg_ram = round(sum(ram_vals) / len(ram_vals), 1)
-        max_ram = round(max(ram_vals), 1)
+        avg_cpu, max_cpu = state["cpu"]
+        avg_ram, max_ram = state["ram"]
 
         context += f"CPU: avg {avg_cpu}%, peak {max_cpu}%\n"
         context += f"RAM: avg {avg_ram}%, peak {max_ram}%\n\n"
 
         # Recent processes
-        latest = snapshots[0]
         context += "Currently running (top processes):\n"
-        for proc in latest[3].split("|")[:5]:
-            context += f"- {proc}\n"
+        for name, proc_cpu, rss_mb in state["processes"]:
+            context += f"- {name}: {proc_cpu}% CPU, {rss_mb} MB RAM\n"
 
         # Network activity
-        if latest[4]:
+        connections = state["connections"]
+        if connections:
             context += "\nNetwork connections:\n"
-            for conn in latest[4].split("|")[:5]:
-                context += f"- {conn}\n"
+            for name, ip in connections:
+                context += f"- {name} -> {ip}\n"
+
+    # Which apps used the network over the last hour
+    if network_apps:
+        context += "\nNetwork use by app (last hour):\n"
+        for name, peers, avg_conns, max_conns, samples in network_apps:
+            context += f"- {name}: {peers} different hosts, {avg_conns} connections on average (max {max_conns})\n"
+
+    # Bandwidth per app
+    for label, talkers in [("last hour", talkers_hour), ("last 24 hours", talkers_day)]:
+        if talkers:
+            context += f"\nBandwidth by app ({label}):\n"
+            for name, sent, received in talkers:
+                context += f"- {name}: {format_bytes(received)} down, {format_bytes(sent)} up\n"
+
+    # Memory that kept growing
+    if growth:
+        context += "\nMemory growth over 6 hours:\n"
+        for name, first_mb, last_mb, samples in growth:
+            context += f"- {name}: {first_mb} MB -> {last_mb} MB ({samples} samples)\n"
+
+    # Steady growth over a whole process lifetime
+    if leaks:
+        context += "\nPossible memory leaks (steady growth since the process started):\n"
+        for name, pid, rate, fit, hours, first_mb, last_mb, hours_to_oom in leaks:
+            context += f"- {name} (PID {pid}): {first_mb} MB -> {last_mb} MB over {hours} h, +{rate} MB/hour (fit {fit})"
+            if hours_to_oom is not None:
+                context += f", free RAM gone in about {hours_to_oom} h at this rate"
+            context += "\n"
+
+    # Stalls say more about slowness than CPU percent does
+    if pressure:
+        context += "\nLast 10 minutes:\n"
+        for metric, label in [("io_stall", "I/O"), ("mem_stall", "memory"), ("cpu_stall", "CPU")]:
+            if metric in pressure:
+                context += f"- Stalled on {label} {pressure[metric]}% of the time\n"
+        if "disk_read" in pressure:
+            context += f"- Disk: {pressure['disk_read']} MB/s read, {pressure['disk_write']} MB/s written"
+            if "disk_latency" in pressure:
+                context += f", {pressure['disk_latency']} ms per request"
+            context += "\n"
+        if pressure.get("swap_in") or pressure.get("swap_out"):
+            context += f"- Swapping: {pressure.get('swap_in', 0)} KB/s in, {pressure.get('swap_out', 0)} KB/s out\n"
+    if io_quarters:
+        context += "\nI/O stall per 15 minutes (avg / max):\n"
+        for ts, low, high, avg, p95 in io_quarters[-8:]:
+            when = datetime.fromtimestamp(ts).strftime("%H:%M")
+            context += f"- {when}: {avg}% / {round(high, 1)}%\n"
+
+    # Short spikes from the 1-minute tier
+    if spikes:
+        context += f"\nCPU spikes (minutes with p95 above {CPU_SPIKE}%): {len(spikes)}\n"
+        for ts, low, high, avg, p95 in spikes[-5:]:
+            when = datetime.fromtimestamp(ts).strftime("%H:%M")
+            context += f"- {when}: avg {avg}%, peak {round(high, 1)}%\n"
+    if quarters:
+        context += "\nCPU per 15 minutes (avg / p95 / max):\n"
+        for ts, low, high, avg, p95 in quarters[-8:]:
+            when = datetime.fromtimestamp(ts).strftime("%H:%M")
+            context += f"- {when}: {avg}% / {round(p95, 1)}% / {round(high, 1)}%\n"
 
     # Suspicious activity
     if suspicious:
@@ -277,6 +1155,17 @@ def build_intelligence_report(query, groq_client=None):
         for e in events[:5]:
             context += f"- {e[0]} [{e[1]}]: {e[2][:100]}\n"
 
+    # API failures and what was running at the time
+    if api_failures:
+        context += "\nAPI failures:\n"
+        for when, api, processes in api_failures[:5]:
+            context += f"- {when} {api} failed"
+            if processes:
+                context += ", running: " + ", ".join(
+                    f"{name} ({cpu}% CPU, {mb} MB RAM)" for name, cpu, mb in processes
+                )
+            context += "\n"
+
     # Ask AI to explain in plain English
     prompt = (
         "You are a PC health expert explaining a computer's behavior to a regular user.\n"
@@ -304,6 +1193,19 @@ def build_intelligence_report(query, groq_client=None):
         result += f"Last 6 hours:\n"
         result += f"CPU: avg {avg_cpu}%, peak {max_cpu}%\n"
         result += f"RAM: avg {avg_ram}%, peak {max_ram}%\n"
+    if spikes:
+        result += f"\nCPU spikes: {len(spikes)} minutes above {CPU_SPIKE}%"
+    if "io_stall" in pressure:
+        result += f"\nYou were I/O-stalled {pressure['io_stall']}% of the last 10 minutes"
+    if "mem_stall" in pressure:
+        result += f"\nMemory-stalled {pressure['mem_stall']}% of the last 10 minutes"
+    if talkers_hour:
+        name, sent, received = talkers_hour[0]
+        result += f"\nTop network user (last hour): {name}, {format_bytes(sent + received)}"
+    for name, pid, rate, fit, hours, first_mb, last_mb, hours_to_oom in leaks:
+        result += f"\nPossible leak: {name} +{rate} MB/hour"
+        if hours_to_oom is not None:
+            result += f", RAM runs out in ~{hours_to_oom} h"
     if suspicious:
         result += f"\nAlerts: {len(suspicious)} suspicious events found"
     if events:
@@ -337,3 +1239,7 @@ class SysWhisperPlugin(Plugin):
 
         except Exception as e:
             return "SysWhisper error: " + str(e), None
+
+# Start background thread when plugin loads, once everything it calls is defined
+monitor_thread = threading.Thread(target=background_loop, daemon=True)
+monitor_thread.start()